@@ -0,0 +1,51 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .versions import get_versions, model_version_name
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для GET-запросов по версиям данных.
+
+    Если клиент прислал актуальный If-None-Match или If-Modified-Since,
+    отвечаем 304, не обращаясь к queryset и сериализатору.
+    """
+
+    version_models = ()
+
+    def get_version_names(self):
+        return [model_version_name(model) for model in self.version_models]
+
+    def get_etag_salt(self, request):
+        return request.get_full_path()
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        versions = get_versions(self.get_version_names())
+        digest = hashlib.md5(
+            f'{self.get_etag_salt(request)}:{versions}'.encode()
+        ).hexdigest()
+        etag = quote_etag(digest)
+        last_modified = max(versions, default=0) // 10 ** 9
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,28 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete
+
+
+def counter_delta(signal, created=False):
+    """На сколько изменить счётчик по сигналу post_save или post_delete."""
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+def update_counter(model, pk, field, delta):
+    """Атомарно меняет денормализованный счётчик одной строки через F()."""
+    if not delta:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def update_counters(model, pks, field, delta):
+    """То же для нескольких строк одним UPDATE ... WHERE id IN (...)."""
+    if not delta or not pks:
+        return
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
@@ -0,0 +1,113 @@
+from operator import attrgetter
+
+from django.db import models
+from rest_framework import serializers
+
+_compiled = {}
+
+
+def _identity(value):
+    return value
+
+
+def _plain_field(getter, convert):
+    def represent(serializer, instance):
+        value = getter(instance)
+        return None if value is None else convert(value)
+    return represent
+
+
+def _file_field(getter):
+    """Как FileField.to_representation, но с запросом из контекста
+    сериализатора, который сейчас отдаёт данные."""
+    def represent(serializer, instance):
+        value = getter(instance)
+        if not value or not getattr(value, 'url', None):
+            return None
+        request = serializer.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(value.url)
+        return value.url
+    return represent
+
+
+def _method_field(method):
+    def represent(serializer, instance):
+        return method(serializer, instance)
+    return represent
+
+
+def _nested_field(getter, steps):
+    def represent(serializer, instance):
+        value = getter(instance)
+        if value is None:
+            return None
+        return {name: step(serializer, value) for name, step in steps}
+    return represent
+
+
+def _nested_list_field(getter, steps):
+    def represent(serializer, instance):
+        value = getter(instance)
+        if isinstance(value, models.Manager):
+            value = value.all()
+        return [
+            {name: step(serializer, item) for name, step in steps}
+            for item in value
+        ]
+    return represent
+
+
+def _compile(serializer):
+    steps = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            getter = _identity
+        else:
+            getter = attrgetter('.'.join(field.source_attrs))
+        if isinstance(field, serializers.SerializerMethodField):
+            step = _method_field(
+                getattr(type(field.parent), field.method_name)
+            )
+        elif isinstance(field, serializers.ListSerializer):
+            step = _nested_list_field(getter, _compile_nested(field.child))
+        elif isinstance(field, serializers.BaseSerializer):
+            step = _nested_field(getter, _compile_nested(field))
+        elif isinstance(field, serializers.FileField):
+            step = _file_field(getter)
+        elif isinstance(field, serializers.CharField):
+            step = _plain_field(getter, str)
+        elif isinstance(field, serializers.IntegerField):
+            step = _plain_field(getter, int)
+        else:
+            step = _plain_field(getter, field.to_representation)
+        steps.append((name, step))
+    return steps
+
+
+def _compile_nested(serializer):
+    if type(serializer).to_representation is not (
+        serializers.Serializer.to_representation
+    ):
+        raise TypeError(
+            f'{type(serializer).__name__} переопределяет to_representation '
+            f'и не может быть вложен в быстрый путь.'
+        )
+    return _compile(serializer)
+
+
+def fast_representation(serializer, instance):
+    """То же, что Serializer.to_representation, без привязки полей.
+
+    Поля сериализатора разбираются один раз на класс: для каждого
+    запоминаются функция чтения атрибута и преобразование значения.
+    Методы get_* вложенных сериализаторов вызываются с корневым
+    сериализатором — контекст у них и так общий.
+    """
+    serializer_class = type(serializer)
+    steps = _compiled.get(serializer_class)
+    if steps is None:
+        steps = _compiled[serializer_class] = _compile(serializer_class())
+    return {name: step(serializer, instance) for name, step in steps}
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+DURATION_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+STATEMENT_MAX_LENGTH = 300
+
+_local = threading.local()
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestSample:
+    """Замеры одного запроса."""
+
+    __slots__ = (
+        'queries', 'sql_time', 'slowest_time', 'slowest_sql',
+        'serializer_time', 'serializer_depth', 'started', 'latency'
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = ''
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.started = time.perf_counter()
+        self.latency = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += duration
+            if duration > self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+
+    def finish(self):
+        self.latency = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return (
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.queries} queries", '
+            f'serializer;dur={self.serializer_time * 1000:.1f}, '
+            f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}'
+        )
+
+
+class RouteMetrics:
+    __slots__ = (
+        'latency', 'sql_time', 'queries', 'serializer_time', 'slowest_time'
+    )
+
+    def __init__(self):
+        self.latency = Histogram(DURATION_BUCKETS)
+        self.sql_time = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.serializer_time = Histogram(DURATION_BUCKETS)
+        self.slowest_time = 0.0
+
+
+def _label(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+class MetricsRegistry:
+    """Гистограммы по маршрутам в памяти процесса.
+
+    Каждый воркер gunicorn копит свои значения; Prometheus суммирует их
+    при опросе всех воркеров.
+    """
+
+    HISTOGRAMS = (
+        ('foodgram_request_duration_seconds', 'latency',
+         'Время обработки запроса.'),
+        ('foodgram_request_sql_duration_seconds', 'sql_time',
+         'Суммарное время SQL-запросов за запрос.'),
+        ('foodgram_request_sql_queries', 'queries',
+         'Число SQL-запросов за запрос.'),
+        ('foodgram_request_serializer_duration_seconds', 'serializer_time',
+         'Время сериализации ответа.'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, sample):
+        """Текст нового самого долгого SQL маршрута пишется в лог: в
+        метке Prometheus каждый новый запрос стал бы новым рядом."""
+        slowest = False
+        with self._lock:
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = RouteMetrics()
+            metrics.latency.observe(sample.latency)
+            metrics.sql_time.observe(sample.sql_time)
+            metrics.queries.observe(sample.queries)
+            metrics.serializer_time.observe(sample.serializer_time)
+            if sample.slowest_time > metrics.slowest_time:
+                metrics.slowest_time = sample.slowest_time
+                slowest = True
+        if slowest:
+            logger.info(
+                'Самый долгий SQL маршрута %s: %.3f с: %s', route,
+                sample.slowest_time,
+                re.sub(r'\s+', ' ', sample.slowest_sql)[:STATEMENT_MAX_LENGTH]
+            )
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for name, attribute, help_text in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for route, metrics in routes:
+                    histogram = getattr(metrics, attribute)
+                    labels = f'route="{_label(route)}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                        )
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+            name = 'foodgram_request_slowest_sql_seconds'
+            lines.append(f'# HELP {name} Самый долгий SQL-запрос маршрута.')
+            lines.append(f'# TYPE {name} gauge')
+            for route, metrics in routes:
+                lines.append(
+                    f'{name}{{route="{_label(route)}"}} {metrics.slowest_time}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _timed_data(data_property):
+    getter = data_property.fget
+
+    @wraps(getter)
+    def data(self):
+        sample = getattr(_local, 'sample', None)
+        if sample is None or sample.serializer_depth:
+            return getter(self)
+        sample.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            sample.serializer_time += time.perf_counter() - started
+            sample.serializer_depth -= 1
+
+    return property(data)
+
+
+def instrument_serializers():
+    """Засекает время обращения к serializer.data верхнего уровня."""
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        serializer_class.data = _timed_data(serializer_class.data)
+
+
+class RequestMetricsMiddleware:
+    """Число и время SQL-запросов, время сериализации и ответа.
+
+    Значения копятся по имени маршрута (recipes-list, download и т.д.)
+    и отдаются клиенту в заголовке Server-Timing. Потоковые ответы
+    учитываются, когда тело отдано целиком. Под ASGI запросы к базе идут в
+    других потоках, поэтому для асинхронной цепочки замеряется только
+    время ответа.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как MiddlewareMixin: иначе Django выполнит всю цепочку
+            # синхронно в одном потоке.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = RequestSample()
+        with self._measure(sample):
+            response = self.get_response(request)
+        return self._observe(request, response, sample)
+
+    async def __acall__(self, request):
+        sample = RequestSample()
+        response = await self.get_response(request)
+        return self._observe(request, response, sample)
+
+    def _observe(self, request, response, sample):
+        route = getattr(request.resolver_match, 'url_name', None)
+        route = route or 'unresolved'
+        response['Server-Timing'] = sample.server_timing()
+        if response.streaming:
+            response.streaming_content = self._measure_stream(
+                response.streaming_content, sample, route
+            )
+        else:
+            sample.finish()
+            registry.observe(route, sample)
+        return response
+
+    def _measure(self, sample):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(sample.execute_wrapper)
+            )
+        _local.sample = sample
+        stack.callback(setattr, _local, 'sample', None)
+        return stack
+
+    def _measure_stream(self, content, sample, route):
+        try:
+            with self._measure(sample):
+                yield from content
+        finally:
+            sample.finish()
+            registry.observe(route, sample)
@@ -0,0 +1,85 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+PAGE_SIZE = 6
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class KeysetPagination(CursorPagination):
+    page_size = PAGE_SIZE
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        """Поля-ссылки сортируем по столбцу *_id, чтобы позиция курсора
+        была значением, а не объектом.
+
+        Курсор хранит позицию и число строк с равным ключом, поэтому их
+        порядок должен быть одним и тем же от запроса к запросу: к
+        неуникальной сортировке (name, author) добавляется id.
+        """
+        ordering = []
+        for field in super().get_ordering(request, queryset, view):
+            descending = field.startswith('-')
+            name = queryset.model._meta.get_field(field.lstrip('-')).attname
+            ordering.append(f'-{name}' if descending else name)
+        pk_name = queryset.model._meta.pk.attname
+        if not {pk_name, f'-{pk_name}'} & set(ordering):
+            descending = ordering[0].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return tuple(ordering)
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """Постраничная пагинация, а с параметром ?cursor= — курсорная.
+
+    Курсорный режим не считает COUNT(*) и не использует OFFSET, поэтому
+    дальние страницы стоят столько же, сколько первая. Пустой ?cursor=
+    открывает первую страницу.
+    """
+
+    page_size = PAGE_SIZE
+    cursor_query_param = 'cursor'
+    keyset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.keyset_pagination = KeysetPagination()
+            return self.keyset_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, который на больших таблицах не считает COUNT(*).
+
+    Для выборки без условий на PostgreSQL число строк берётся из
+    статистики планировщика (pg_class.reltuples). Оценка используется,
+    только если она больше ESTIMATED_COUNT_THRESHOLD; иначе и для
+    отфильтрованных выборок считается точное число.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class '
+                        'WHERE oid = %s::regclass',
+                        (queryset.model._meta.db_table,)
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                    return row[0]
+        return super().count
@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from .versions import get_versions
+
+RESPONSE_KEY = 'response:{digest}'
+
+
+class AnonymousResponseCacheMixin:
+    """Кеш ответов list и retrieve для анонимных пользователей.
+
+    Ключ — адрес, параметры из cache_query_params в каноническом порядке
+    и версии данных из get_cache_version_names(). Изменение данных
+    сдвигает версию, и старые ответы больше не находятся.
+    """
+
+    cache_query_params = ()
+
+    def get_cache_version_names(self, request):
+        """Версии, от которых зависит ответ, или None — не кешировать."""
+        return ()
+
+    def normalized_query(self, request):
+        return urlencode(sorted(
+            (name, value)
+            for name in self.cache_query_params
+            for value in request.query_params.getlist(name)
+        ))
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        version_names = self.get_cache_version_names(request)
+        if version_names is None:
+            return handler(request, *args, **kwargs)
+        versions = get_versions(version_names)
+        digest = hashlib.md5(
+            f'{request.build_absolute_uri(request.path)}?'
+            f'{self.normalized_query(request)}:{versions}'.encode()
+        ).hexdigest()
+        key = RESPONSE_KEY.format(digest=digest)
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        cached = cache.get(key)
+        if cached is not None:
+            return Response(cached)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
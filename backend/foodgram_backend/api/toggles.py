@@ -0,0 +1,288 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+
+from .renderers import FastJSONRenderer
+
+RETURNING_VENDORS = ('postgresql', 'sqlite')
+
+
+def _link_columns(model, target_field):
+    opts = model._meta
+    user = opts.get_field('user')
+    target = opts.get_field(target_field)
+    return user, target
+
+
+def _default_columns(model, connection, *skip):
+    """Остальные поля связи со значениями по умолчанию, как их выставил
+    бы Model(): в сыром INSERT Django их не подставит."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field not in skip
+    ]
+    columns = ''.join(
+        f', {connection.ops.quote_name(field.column)}' for field in fields
+    )
+    values = tuple(
+        field.get_db_prep_save(field.get_default(), connection)
+        for field in fields
+    )
+    return columns, values
+
+
+def _link_instance(model, pk, user_id, target_field, target_id, using):
+    """Экземпляр для сигналов, собранный без запроса к базе."""
+    user, target = _link_columns(model, target_field)
+    instance = model(
+        pk=pk, **{user.attname: user_id, target.attname: target_id}
+    )
+    instance._state.adding = False
+    instance._state.db = using
+    return instance
+
+
+def insert_link(model, user_id, target_field, target_id):
+    """Добавляет связь пользователя с объектом одним запросом.
+
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: строка не
+    вставится, если объекта нет или связь уже есть. Возвращает True, если
+    связь добавлена. Обработчики post_save получают сигнал, как при
+    Model.save().
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    user, target = _link_columns(model, target_field)
+    target_opts = target.related_model._meta
+    with transaction.atomic(using):
+        if connection.vendor not in RETURNING_VENDORS:
+            if not target.related_model.objects.using(using).filter(
+                pk=target_id
+            ).exists():
+                return False
+            instance, created = model.objects.using(using).get_or_create(
+                **{user.attname: user_id, target.attname: target_id}
+            )
+            return created
+        qn = connection.ops.quote_name
+        columns, values = _default_columns(model, connection, user, target)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(model._meta.db_table)} '
+                f'({qn(user.column)}, {qn(target.column)}{columns}) '
+                f'SELECT %s, {qn(target_opts.pk.column)}'
+                f'{", %s" * len(values)} '
+                f'FROM {qn(target_opts.db_table)} '
+                f'WHERE {qn(target_opts.pk.column)} = %s '
+                f'ON CONFLICT DO NOTHING '
+                f'RETURNING {qn(model._meta.pk.column)}',
+                (user_id, *values, target_id)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        post_save.send(
+            sender=model,
+            instance=_link_instance(
+                model, row[0], user_id, target_field, target_id, using
+            ),
+            created=True,
+            update_fields=None,
+            raw=False,
+            using=using
+        )
+    return True
+
+
+def delete_link(model, user_id, target_field, target_id):
+    """Удаляет связь одним DELETE ... RETURNING.
+
+    Возвращает True, если связь была. Обработчики post_delete получают
+    сигнал, как при Model.delete().
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    user, target = _link_columns(model, target_field)
+    with transaction.atomic(using):
+        if connection.vendor not in RETURNING_VENDORS:
+            deleted, _ = model.objects.using(using).filter(
+                **{user.attname: user_id, target.attname: target_id}
+            ).delete()
+            return bool(deleted)
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {qn(model._meta.db_table)} '
+                f'WHERE {qn(user.column)} = %s AND {qn(target.column)} = %s '
+                f'RETURNING {qn(model._meta.pk.column)}',
+                (user_id, target_id)
+            )
+            rows = cursor.fetchall()
+        for (pk,) in rows:
+            post_delete.send(
+                sender=model,
+                instance=_link_instance(
+                    model, pk, user_id, target_field, target_id, using
+                ),
+                using=using
+            )
+    return bool(rows)
+
+
+def insert_links(model, user_id, target_field, target_ids):
+    """Добавляет связи пользователя с несколькими объектами одним
+    INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Возвращает id объектов, связи с которыми добавлены. Сигналы post_save
+    не отправляются: побочные эффекты вызывающий применяет сам, одним
+    запросом на всю пачку.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    user, target = _link_columns(model, target_field)
+    if connection.vendor not in RETURNING_VENDORS:
+        existing = set(
+            model.objects.using(using).filter(
+                **{user.attname: user_id, f'{target.attname}__in': target_ids}
+            ).values_list(target.attname, flat=True)
+        )
+        added = [
+            target_id for target_id in target_ids
+            if target_id not in existing
+        ]
+        model.objects.using(using).bulk_create(
+            (
+                model(**{user.attname: user_id, target.attname: target_id})
+                for target_id in added
+            ),
+            ignore_conflicts=True
+        )
+        return added
+    target_opts = target.related_model._meta
+    qn = connection.ops.quote_name
+    columns, values = _default_columns(model, connection, user, target)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(model._meta.db_table)} '
+            f'({qn(user.column)}, {qn(target.column)}{columns}) '
+            f'SELECT %s, {qn(target_opts.pk.column)}'
+            f'{", %s" * len(values)} '
+            f'FROM {qn(target_opts.db_table)} '
+            f'WHERE {qn(target_opts.pk.column)} IN '
+            f'({", ".join(["%s"] * len(target_ids))}) '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {qn(target.column)}',
+            (user_id, *values, *target_ids)
+        )
+        return [target_id for (target_id,) in cursor.fetchall()]
+
+
+def delete_links(model, user_id, target_field, target_ids):
+    """Удаляет связи с несколькими объектами одним DELETE ... RETURNING.
+
+    Возвращает id объектов, связи с которыми были. Сигналы post_delete не
+    отправляются, как и в insert_links.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    user, target = _link_columns(model, target_field)
+    links = model.objects.using(using).filter(
+        **{user.attname: user_id, f'{target.attname}__in': target_ids}
+    )
+    if connection.vendor not in RETURNING_VENDORS:
+        deleted = list(links.values_list(target.attname, flat=True))
+        # QuerySet.delete() отправил бы post_delete для каждой строки.
+        links._raw_delete(using)
+        return deleted
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {qn(model._meta.db_table)} '
+            f'WHERE {qn(user.column)} = %s AND {qn(target.column)} IN '
+            f'({", ".join(["%s"] * len(target_ids))}) '
+            f'RETURNING {qn(target.column)}',
+            (user_id, *target_ids)
+        )
+        return [target_id for (target_id,) in cursor.fetchall()]
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(
+        FastJSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json'
+    )
+    for header, value in (headers or {}).items():
+        response[header] = value
+    return response
+
+
+def _authenticate(request):
+    """Аутентификация классами из DEFAULT_AUTHENTICATION_CLASSES."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    raise exceptions.NotAuthenticated()
+
+
+def _authentication_error(request, exc):
+    """Как APIView: 401 с WWW-Authenticate от первого класса, иначе 403."""
+    headers = {}
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    if authentication_classes:
+        headers['WWW-Authenticate'] = (
+            authentication_classes[0]().authenticate_header(request)
+        )
+    return json_response(
+        {'detail': exc.detail},
+        status.HTTP_401_UNAUTHORIZED if headers
+        else status.HTTP_403_FORBIDDEN,
+        headers
+    )
+
+
+def _run_handler(handler, request, kwargs):
+    try:
+        try:
+            user = _authenticate(request)
+        except (exceptions.AuthenticationFailed,
+                exceptions.NotAuthenticated) as exc:
+            return _authentication_error(request, exc)
+        data, status_code = handler(user, **kwargs)
+        return json_response(data, status_code)
+    finally:
+        close_old_connections()
+
+
+def async_toggle_view(post, delete):
+    """Асинхронный view для добавления (POST) и удаления (DELETE) связи.
+
+    post и delete принимают пользователя и параметры маршрута и возвращают
+    пару (данные, код ответа). В Django 3.2 нет асинхронного ORM, а под
+    ASGI синхронные view выполняются по очереди в одном потоке. Поэтому
+    аутентификация и работа с базой уходят в пул потоков одним переходом
+    sync_to_async(thread_sensitive=False), и переключатели разных
+    пользователей выполняются параллельно.
+    """
+    handlers = {'POST': post, 'DELETE': delete}
+    run = sync_to_async(_run_handler, thread_sensitive=False)
+
+    async def view(request, **kwargs):
+        handler = handlers.get(request.method)
+        if handler is None:
+            return HttpResponseNotAllowed(tuple(handlers))
+        return await run(handler, request, kwargs)
+
+    # csrf_exempt в Django 3.2 оборачивает view в синхронную функцию.
+    view.csrf_exempt = True
+    return view
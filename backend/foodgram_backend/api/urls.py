@@ -1,8 +1,11 @@
 from django.urls import path, include
 
+from .views import metrics
+
 app_name = 'api'
 
 urlpatterns = [
+   path('_metrics', metrics, name='metrics'),
    path('', include('users.urls', namespace='users')),
    path('', include('recipes.urls', namespace='recipes'))
 ]
@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{name}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def model_version_name(model):
+    return model._meta.label_lower
+
+
+def get_version(name):
+    """Текущая версия набора данных.
+
+    Версия — время последнего изменения в наносекундах, поэтому она же
+    служит значением Last-Modified.
+    """
+    return cache.get_or_set(VERSION_KEY.format(name=name), _new_version, None)
+
+
+def get_versions(names):
+    keys = [VERSION_KEY.format(name=name) for name in names]
+    found = cache.get_many(keys)
+    return [
+        found[key] if key in found
+        else cache.get_or_set(key, _new_version, None)
+        for key in keys
+    ]
+
+
+def bump_version(name):
+    cache.set(VERSION_KEY.format(name=name), _new_version(), None)
+
+
+def bump_versions(names):
+    version = _new_version()
+    cache.set_many(
+        {VERSION_KEY.format(name=name): version for name in names}, None
+    )
+
+
+def bump_model_version(model):
+    bump_version(model_version_name(model))
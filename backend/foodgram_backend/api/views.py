@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+
+from .metrics import registry
+
+
+@api_view(('GET',))
+@permission_classes((permissions.IsAdminUser,))
+def metrics(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
+# Только для benchmark_toggles: в Django 3.2 синхронные view под ASGI
+# выполняются в одном потоке, рабочий режим — WSGI.
+os.environ.setdefault('ASYNC_TOGGLES', 'True')
 
 application = get_asgi_application()
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -77,13 +78,45 @@ DATABASES = {
     }
 }
 
+# Версии данных (api/versions.py), токены и кэш данных рецептов должны
+# быть общими для всех процессов, включая manage.py из docker-compose exec.
+# В docker-compose это memcached; LocMemCache у каждого процесса свой и
+# годится только для разработки и замеров в одном процессе.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        # memcached вытесняет записи сам и MAX_ENTRIES не принимает.
+        'OPTIONS': {} if '.memcached.' in CACHE_BACKEND else {
+            'MAX_ENTRIES': int(
+                os.getenv('CACHE_MAX_ENTRIES', default=100000)
+            ),
+        },
+    }
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 DJOSER = {
@@ -133,6 +166,40 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+BULK_RECIPES_MAX = 100
+
+FEED_SIZE = int(os.getenv('FEED_SIZE', default=300))
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=1000)
+)
+
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', default='default')
+RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_TIMEOUT', default=60 * 60)
+)
+RECIPE_PAYLOAD_CACHE = (
+    os.getenv('RECIPE_PAYLOAD_CACHE', default='True') == 'True'
+)
+
+FAST_READ_SERIALIZERS = (
+    os.getenv('FAST_READ_SERIALIZERS', default='True') == 'True'
+)
+
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_LOCAL_TTL = 5
+TOKEN_CACHE_TIMEOUT = 300
+
+ASYNC_TOGGLES = os.getenv('ASYNC_TOGGLES', default='False') == 'True'
+
+FAST_JSON = os.getenv('FAST_JSON', default='True') == 'True'
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='True') == 'True'
+
 AUTH_USER_MODEL = 'users.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from api.pagination import EstimatedCountPaginator
 from .models import (
     Favorite,
     Ingredient,
@@ -6,27 +8,128 @@ from .models import (
     Tag,
     TagsInRecipe,
     Recipe,
-    ShoppingCart
+    ShoppingCart,
+    tags_mask
 )
+from .response_cache import invalidate_recipe_contents
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без точного COUNT(*) по всей таблице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RecipeContentsAdmin(LargeTableAdmin):
+    """Строки ингредиентов и тегов рецепта.
+
+    Удаление пачкой обходит сигналы post_delete, поэтому кэши, списки
+    покупок и поиск затронутых рецептов обновляются здесь явно.
+    """
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id, form.initial.get('recipe')}
+        tag_slugs = self.tag_slugs(self.model.objects.filter(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        self.recipes_changed(recipe_ids - {None}, tag_slugs)
+
+    def delete_model(self, request, obj):
+        tag_slugs = self.tag_slugs(self.model.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        self.recipes_changed({obj.recipe_id}, tag_slugs)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        tag_slugs = self.tag_slugs(queryset)
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(recipe_ids, tag_slugs)
+
+    def tag_slugs(self, queryset):
+        """Теги строк до изменения: после него рецепт их уже не видит."""
+        return ()
+
+    def recipes_changed(self, recipe_ids, tag_slugs):
+        invalidate_recipe_contents(recipe_ids, tag_slugs=tag_slugs)
+
+
+class IngredientsInRecipeInline(admin.TabularInline):
+    model = IngredientsInRecipe
+    autocomplete_fields = ('ingredient',)
+    extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe__author', 'ingredient'
+        )
 
-class RecipeAdmin(admin.ModelAdmin):
-    list_filter = ('author', 'name', 'tags', )
-    list_display = ('author', 'name', 'is_favorite_count', )
 
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('name', 'author', 'is_favorite_count', 'in_carts_count')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username')
+    autocomplete_fields = ('author',)
+    inlines = (IngredientsInRecipeInline,)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_recipe_contents((form.instance.pk,))
+
+    @admin.display(
+        description='Сколько раз добавлен в избранное',
+        ordering='favorites_count'
+    )
     def is_favorite_count(self, obj):
-        result = Favorite.objects.filter(recipe=obj).count()
-        return result
+        return obj.favorites_count
+
+
+class IngredientsAdmin(LargeTableAdmin):
+    list_display = ('name', 'measurement_unit')
+    search_fields = ('^name',)
+    ordering = ('name', 'measurement_unit')
+
+
+class IngredientsInRecipeAdmin(RecipeContentsAdmin):
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe__author', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+
+
+class TagsInRecipeAdmin(RecipeContentsAdmin):
+    list_display = ('recipe', 'tag')
+    list_select_related = ('recipe__author', 'tag')
+    autocomplete_fields = ('recipe',)
+
+    def tag_slugs(self, queryset):
+        return set(queryset.values_list('tag__slug', flat=True))
+
+    def recipes_changed(self, recipe_ids, tag_slugs):
+        """Маска тегов пересчитывается так же, как во view рецепта."""
+        for recipe_id in recipe_ids:
+            Recipe.objects.filter(pk=recipe_id).update(tags_mask=tags_mask(
+                TagsInRecipe.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('tag_id', flat=True)
+            ))
+        super().recipes_changed(recipe_ids, tag_slugs)
+
+
+class FavoriteAdmin(LargeTableAdmin):
+    list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
 
 
-class IngredientsAdmin(admin.ModelAdmin):
-    list_filter = ('name',)
+class ShoppingCartAdmin(LargeTableAdmin):
+    list_display = ('user', 'recipe', 'servings')
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
 
 
 admin.site.register(Tag)
 admin.site.register(Ingredient, IngredientsAdmin)
 admin.site.register(Recipe, RecipeAdmin)
-admin.site.register(IngredientsInRecipe)
-admin.site.register(TagsInRecipe)
-admin.site.register(Favorite)
-admin.site.register(ShoppingCart)
+admin.site.register(IngredientsInRecipe, IngredientsInRecipeAdmin)
+admin.site.register(TagsInRecipe, TagsInRecipeAdmin)
+admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(ShoppingCart, ShoppingCartAdmin)
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db import transaction
+
+from users.models import Follow, User
+from .models import Recipe, Timeline
+
+
+def is_fan_out_on_read(author_id):
+    """У популярных авторов рецепты не рассылаются подписчикам, а
+    подмешиваются в ленту при чтении."""
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def _merge(*id_lists):
+    return sorted(
+        set().union(*id_lists), reverse=True
+    )[:settings.FEED_SIZE]
+
+
+def _pushed_recipe_ids(user_id):
+    """Рецепты авторов из подписок, которые рассылаются при записи."""
+    return list(
+        Recipe.objects.filter(
+            author__following__user_id=user_id,
+            author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).order_by('-id').values_list('id', flat=True)[:settings.FEED_SIZE]
+    )
+
+
+def _pulled_recipe_ids(user_id):
+    """Последние рецепты популярных авторов из подписок."""
+    return list(
+        Recipe.objects.filter(
+            author__following__user_id=user_id,
+            author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).order_by('-id').values_list('id', flat=True)[:settings.FEED_SIZE]
+    )
+
+
+def _locked_timeline(user_id):
+    """Лента пользователя под блокировкой; отсутствующая строится заново."""
+    timeline = Timeline.objects.select_for_update().filter(
+        user_id=user_id
+    ).first()
+    if timeline is None:
+        timeline, _ = Timeline.objects.get_or_create(
+            user_id=user_id,
+            defaults={'recipe_ids': _pushed_recipe_ids(user_id)}
+        )
+    return timeline
+
+
+def fan_out_recipe(recipe_id, author_id):
+    """Добавляет новый рецепт в начало лент всех подписчиков автора.
+
+    Подписчиков без строки ленты рецепт не касается: её целиком, вместе
+    с этим рецептом, строит чтение в get_feed_ids.
+    """
+    if is_fan_out_on_read(author_id):
+        return
+    with transaction.atomic():
+        # Строки блокируются по порядку ключа, чтобы рассылки с
+        # пересекающимися подписчиками не ждали друг друга по кругу.
+        timelines = list(
+            Timeline.objects.select_for_update().filter(
+                user_id__in=Follow.objects.filter(
+                    author_id=author_id
+                ).values('user_id')
+            ).order_by('pk')
+        )
+        for timeline in timelines:
+            timeline.recipe_ids = _merge(timeline.recipe_ids, (recipe_id,))
+        Timeline.objects.bulk_update(timelines, ('recipe_ids',))
+
+
+def backfill_timeline(user_id, author_id):
+    """После подписки добавляет в ленту последние рецепты автора."""
+    if is_fan_out_on_read(author_id):
+        return
+    with transaction.atomic():
+        timeline = _locked_timeline(user_id)
+        timeline.recipe_ids = _merge(
+            timeline.recipe_ids,
+            Recipe.objects.filter(author_id=author_id).order_by(
+                '-id'
+            ).values_list('id', flat=True)[:settings.FEED_SIZE]
+        )
+        timeline.save(update_fields=('recipe_ids',))
+
+
+def prune_timeline(user_id, author_id):
+    """После отписки убирает из ленты рецепты автора."""
+    with transaction.atomic():
+        timeline = Timeline.objects.select_for_update().filter(
+            user_id=user_id
+        ).first()
+        if timeline is None:
+            return
+        removed = set(
+            Recipe.objects.filter(
+                id__in=timeline.recipe_ids, author_id=author_id
+            ).values_list('id', flat=True)
+        )
+        timeline.recipe_ids = [
+            recipe_id for recipe_id in timeline.recipe_ids
+            if recipe_id not in removed
+        ]
+        timeline.save(update_fields=('recipe_ids',))
+
+
+def drop_missing_recipes(user_id, missing_ids):
+    """Убирает из ленты рецепты, которых уже нет."""
+    with transaction.atomic():
+        timeline = Timeline.objects.select_for_update().filter(
+            user_id=user_id
+        ).first()
+        if timeline is None:
+            return
+        timeline.recipe_ids = [
+            recipe_id for recipe_id in timeline.recipe_ids
+            if recipe_id not in missing_ids
+        ]
+        timeline.save(update_fields=('recipe_ids',))
+
+
+def get_feed_ids(user_id):
+    """id рецептов ленты от новых к старым: разосланные при записи плюс
+    рецепты популярных авторов, прочитанные сейчас."""
+    recipe_ids = Timeline.objects.filter(user_id=user_id).values_list(
+        'recipe_ids', flat=True
+    ).first()
+    if recipe_ids is None:
+        with transaction.atomic():
+            recipe_ids = _locked_timeline(user_id).recipe_ids
+    return _merge(recipe_ids, _pulled_recipe_ids(user_id))
+
+
+def get_feed_ids_on_read(user_id):
+    """Та же лента, целиком собранная соединением Follow и Recipe."""
+    return list(
+        Recipe.objects.filter(
+            author__following__user_id=user_id
+        ).order_by('-id').values_list('id', flat=True)[:settings.FEED_SIZE]
+    )
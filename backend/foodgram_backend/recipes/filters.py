@@ -1,6 +1,8 @@
 import django_filters
+from rest_framework import filters
 
 from .models import Tag
+from .search import search_recipes
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -8,4 +10,57 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
-    )
\ No newline at end of file
+        method='filter_tags'
+    )
+    tags_match = django_filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_match'
+    )
+    author = django_filters.NumberFilter(field_name='author_id')
+    is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
+    is_in_shopping_cart = django_filters.NumberFilter(
+        method='filter_is_in_shopping_cart'
+    )
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов, а с ?tags_match=all — со всеми."""
+        return queryset.with_tags(
+            (tag.id for tag in value),
+            match_all=self.form.cleaned_data.get('tags_match') == 'all'
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_is_favorited(self, queryset, name, value):
+        """С ?is_favorited=1 — только избранное; анониму фильтр не
+        применяется."""
+        user = self.request.user
+        if value != 1 or user.is_anonymous:
+            return queryset
+        return queryset.filter(favorite_recipe__user=user)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        user = self.request.user
+        if value != 1 or user.is_anonymous:
+            return queryset
+        return queryset.filter(shopping_cart_recipe__user=user)
+
+
+class RecipeSearchFilter(filters.BaseFilterBackend):
+    """Полнотекстовый поиск ?search= по названию, описанию и ингредиентам.
+
+    Без явного ?ordering= результаты сортируются по релевантности;
+    курсорная пагинация сохраняет порядок по id.
+    """
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search_recipes(queryset, query)
+        if filters.OrderingFilter.ordering_param in request.query_params:
+            return queryset
+        return queryset.order_by('-search_rank', '-id')
@@ -0,0 +1,197 @@
+import base64
+import binascii
+import io
+import logging
+import posixpath
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connections, transaction
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .models import Recipe
+from .response_cache import invalidate_recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'list': (480, 480),
+    'detail': (1200, 1200),
+}
+RENDITION_QUALITY = 82
+DECODE_CHUNK_SIZE = 64 * 1024
+NON_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+_executor = None
+
+
+class Base64ImageField(serializers.ImageField):
+    """Картинка в base64, которая пишется на диск по частям.
+
+    Размер проверяется до декодирования, содержимое — через Pillow.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or ';base64,' not in data:
+            self.fail('invalid_image')
+        header, encoded = data.split(';base64,', 1)
+        declared_extension = header.rsplit('/', 1)[-1]
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(encoded) // 4 * 3 > max_size:
+            raise serializers.ValidationError(
+                f'Картинка должна быть не больше {max_size // 2 ** 20} МБ.'
+            )
+
+        file = TemporaryUploadedFile(
+            name=f'image.{declared_extension}',
+            content_type=None,
+            size=0,
+            charset=None
+        )
+        # Как и b64decode, пропускаем символы вне алфавита (переносы строк
+        # MIME и пробелы) и декодируем части, кратные четырём символам.
+        remainder = ''
+        try:
+            for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+                chunk = remainder + NON_BASE64.sub(
+                    '', encoded[start:start + DECODE_CHUNK_SIZE]
+                )
+                aligned = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:aligned]))
+                remainder = chunk[aligned:]
+            if remainder:
+                file.write(base64.b64decode(remainder))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_image')
+        file.size = file.tell()
+        file.seek(0)
+
+        image_file = super().to_internal_value(file)
+        extension = IMAGE_EXTENSIONS.get(image_file.image.format)
+        if extension is None:
+            self.fail('invalid_image')
+        image_file.name = f'{uuid.uuid4()}.{extension}'
+        return image_file
+
+
+def image_url(request, name):
+    """Абсолютная ссылка на файл. Для файлового хранилища адрес MEDIA_URL
+    строится один раз на запрос, а не для каждой из картинок."""
+    if not name:
+        return None
+    if request is not None and isinstance(default_storage, FileSystemStorage):
+        media_url = getattr(request, '_absolute_media_url', None)
+        if media_url is None:
+            media_url = request._absolute_media_url = (
+                request.build_absolute_uri(default_storage.base_url)
+            )
+        return media_url + filepath_to_uri(name).lstrip('/')
+    url = default_storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def rendition_urls(request, recipe):
+    """Ссылки на оригинал и все варианты картинки рецепта.
+
+    Пока варианты не готовы, вместо них отдаётся оригинал.
+    """
+    renditions = recipe.image_renditions or {}
+    urls = {'original': image_url(request, recipe.image.name)}
+    for name in RENDITIONS:
+        for variant in (name, f'{name}_webp'):
+            urls[variant] = image_url(
+                request, renditions.get(variant) or recipe.image.name
+            )
+    return urls
+
+
+def _save_rendition(image, source_name, rendition, image_format):
+    stem = posixpath.splitext(posixpath.basename(source_name))[0]
+    extension = IMAGE_EXTENSIONS[image_format]
+    buffer = io.BytesIO()
+    image.save(
+        buffer, image_format, quality=RENDITION_QUALITY, optimize=True
+    )
+    return default_storage.save(
+        posixpath.join(
+            posixpath.dirname(source_name),
+            'renditions',
+            f'{stem}_{rendition}.{extension}'
+        ),
+        ContentFile(buffer.getvalue())
+    )
+
+
+def build_renditions(recipe_id, image_name):
+    """Уменьшенные копии картинки рецепта для списка и страницы рецепта
+    в исходном формате (JPEG или PNG с прозрачностью) и в WebP."""
+    with default_storage.open(image_name) as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    base_format = 'PNG' if has_alpha else 'JPEG'
+
+    renditions = {}
+    for rendition, size in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        renditions[rendition] = _save_rendition(
+            resized, image_name, rendition, base_format
+        )
+        renditions[f'{rendition}_webp'] = _save_rendition(
+            resized, image_name, rendition, 'WEBP'
+        )
+    if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_renditions=renditions
+    ):
+        invalidate_recipe(recipe_id)
+    return renditions
+
+
+def _build_in_worker(recipe_id, image_name):
+    try:
+        build_renditions(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить картинки рецепта %s', recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """Ставит подготовку картинок в очередь после фиксации транзакции.
+
+    Если RECIPE_IMAGE_WORKERS равно 0, картинки готовятся сразу.
+    """
+    global _executor
+    task = partial(build_renditions, recipe.pk, recipe.image.name)
+    if settings.RECIPE_IMAGE_WORKERS:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+        task = partial(
+            _executor.submit, _build_in_worker, recipe.pk, recipe.image.name
+        )
+    transaction.on_commit(task)
@@ -0,0 +1,68 @@
+import threading
+from bisect import bisect_left
+from itertools import chain
+
+from api.versions import get_version, model_version_name
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Отсортированный массив названий в casefold ищется через bisect.
+    Индекс строится при первом запросе и перестраивается, когда меняется
+    версия таблицы ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # Ключи и строки меняются одним присваиванием, чтобы поиск во
+        # время перестройки не взял ключи одного индекса и строки другого.
+        self._index = ([], [])
+
+    def _build(self, version):
+        entries = sorted(
+            (
+                (name.casefold(), ingredient_id),
+                {
+                    'id': ingredient_id,
+                    'name': name,
+                    'measurement_unit': measurement_unit
+                }
+            )
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self._index = (
+            [key for (key, _), _ in entries],
+            [row for _, row in entries]
+        )
+        self._version = version
+
+    def _ensure_fresh(self):
+        version = get_version(model_version_name(Ingredient))
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build(version)
+
+    def search(self, query):
+        """Сначала ингредиенты, начинающиеся с query, затем содержащие его."""
+        self._ensure_fresh()
+        query = query.casefold()
+        keys, rows = self._index
+        start = end = bisect_left(keys, query)
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        return rows[start:end] + [
+            rows[position]
+            for position in chain(range(start), range(end, len(keys)))
+            if query in keys[position]
+        ]
+
+
+ingredient_index = IngredientIndex()
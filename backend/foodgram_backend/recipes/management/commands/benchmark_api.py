@@ -0,0 +1,386 @@
+import base64
+import io
+import json
+import logging
+import math
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes import urls as recipes_urls
+from recipes.models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, Tag
+)
+from users import urls as users_urls
+from users.models import Follow, User
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmark_baseline.json'
+PASSWORD = 'benchmark-password'
+# Меньшие отклонения — шум измерения, а не регрессия.
+MIN_DELTA = {'p95_ms': 5, 'peak_kib': 64}
+
+
+class Rollback(Exception):
+    pass
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name != 'api-root':
+            yield pattern.name
+
+
+def scenario_label(name, method, path):
+    """Ключ сценария в отчёте и эталоне: метод, маршрут и имена
+    параметров запроса. Значения параметров зависят от данных и в ключ
+    не входят."""
+    params = sorted(parse_qs(urlsplit(path).query))
+    label = f'{method} {name}'
+    return f'{label} ?{"&".join(params)}' if params else label
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def tiny_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), '#E26C2D').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все маршруты recipes и users через тестовый клиент и '
+        'сравнивает задержку, число запросов к БД и пик памяти с '
+        'сохранённым эталоном. Изменения данных откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--baseline', default=str(DEFAULT_BASELINE),
+            help='JSON-файл с эталонными результатами.'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результаты как новый эталон.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост задержки p95 и памяти, доля от эталона.'
+        )
+
+    def handle(self, *args, **options):
+        if settings.ASYNC_TOGGLES:
+            # Асинхронные переключатели пишут в базу из своих потоков, мимо
+            # точки сохранения, которая откатывает каждый запрос.
+            raise CommandError(
+                'benchmark_api меряет WSGI: запустите с ASYNC_TOGGLES=False; '
+                'переключатели под ASGI меряет benchmark_toggles.'
+            )
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    MEDIA_ROOT=media_root
+                ):
+                    results = self.run(options['requests'], options['warmup'])
+        finally:
+            request_logger.setLevel(level)
+        self.report(results)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.write_text(
+                json.dumps(results, indent=2, sort_keys=True)
+            )
+            self.stdout.write(f'Эталон сохранён в {baseline_path}')
+            return
+        if not baseline_path.exists():
+            self.stdout.write(
+                'Эталона нет; сохраните его флагом --save-baseline.'
+            )
+            return
+        regressions = self.regressions(
+            results, json.loads(baseline_path.read_text()),
+            options['tolerance']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессия относительно эталона:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def run(self, requests, warmup):
+        results = {}
+        try:
+            with transaction.atomic():
+                scenarios = self.scenarios()
+                self.check_coverage(scenarios)
+                for name, method, path, data, client in scenarios:
+                    label = scenario_label(name, method, path)
+                    if label in results:
+                        raise CommandError(f'Сценарий {label} повторяется.')
+                    results[label] = self.measure(
+                        client, method, path, data, requests, warmup
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def scenarios(self):
+        user_id = Follow.objects.values('user').annotate(
+            follows=Count('id')
+        ).order_by('-follows', 'user').values_list('user', flat=True).first()
+        if user_id is None:
+            raise CommandError('Нет данных; запустите seed_benchmark.')
+        user = User.objects.get(pk=user_id)
+        user.set_password(PASSWORD)
+        user.save(update_fields=('password',))
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = APIClient()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        owner_token, _ = Token.objects.get_or_create(user_id=recipe.author_id)
+        owner = APIClient()
+        owner.credentials(HTTP_AUTHORIZATION=f'Token {owner_token.key}')
+        author = User.objects.order_by('-recipes_count', 'id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        favorite = Favorite.objects.filter(user=user).first()
+        in_cart = ShoppingCart.objects.filter(user=user).first()
+        followed = Follow.objects.filter(user=user).first()
+        new_recipe = Recipe.objects.exclude(
+            favorite_recipe__user=user
+        ).exclude(shopping_cart_recipe__user=user).order_by('id').first()
+        new_author = User.objects.exclude(following__user=user).exclude(
+            pk=user.pk
+        ).order_by('-recipes_count', 'id').first()
+        recipe_data = {
+            'name': 'Замер',
+            'text': 'Рецепт для замера',
+            'cooking_time': 10,
+            'image': tiny_png(),
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 100}],
+        }
+        bulk_ids = {'recipes': list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:30]
+        )}
+        favorite_id = favorite.recipe_id if favorite else recipe.id
+        cart_id = in_cart.recipe_id if in_cart else recipe.id
+        followed_id = followed.author_id if followed else author.id
+        return (
+            ('tags-list', 'get', '/api/tags/', None, anonymous),
+            ('tags-detail', 'get', f'/api/tags/{tag.id}/', None, anonymous),
+            ('ingredients-list', 'get', '/api/ingredients/', None,
+             anonymous),
+            ('ingredients-list', 'get',
+             f'/api/ingredients/?name={ingredient.name[:2]}', None,
+             anonymous),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{ingredient.id}/', None, anonymous),
+            ('recipes-list', 'get', '/api/recipes/', None, anonymous),
+            ('recipes-list', 'get',
+             f'/api/recipes/?tags={tag.slug}&is_favorited=1', None, client),
+            ('recipes-list', 'post', '/api/recipes/', recipe_data, client),
+            ('recipes-feed', 'get', '/api/recipes/feed/', None, client),
+            ('recipes-detail', 'get', f'/api/recipes/{recipe.id}/', None,
+             client),
+            ('recipes-detail', 'patch', f'/api/recipes/{recipe.id}/',
+             recipe_data, owner),
+            ('recipes-detail', 'delete', f'/api/recipes/{recipe.id}/', None,
+             owner),
+            ('favorite-list', 'post',
+             f'/api/recipes/{new_recipe.id}/favorite/', None, client),
+            ('favorite-delete', 'delete',
+             f'/api/recipes/{favorite_id}/favorite/', None, client),
+            ('favorite-detail', 'delete',
+             f'/api/recipes/{favorite_id}/favorite/{favorite_id}/', None,
+             client),
+            ('shopping_cart-list', 'post',
+             f'/api/recipes/{new_recipe.id}/shopping_cart/', None, client),
+            ('shopping_cart-delete', 'delete',
+             f'/api/recipes/{cart_id}/shopping_cart/', None, client),
+            ('shopping_cart-servings', 'patch',
+             f'/api/recipes/{cart_id}/shopping_cart/servings/',
+             {'servings': 2}, client),
+            ('shopping_cart-detail', 'delete',
+             f'/api/recipes/{cart_id}/shopping_cart/{cart_id}/', None,
+             client),
+            ('recipes-bulk-favorite', 'post', '/api/recipes/favorite/',
+             bulk_ids, client),
+            ('recipes-bulk-favorite', 'delete', '/api/recipes/favorite/',
+             bulk_ids, client),
+            ('recipes-bulk-shopping-cart', 'post',
+             '/api/recipes/shopping_cart/', bulk_ids, client),
+            ('recipes-bulk-shopping-cart', 'delete',
+             '/api/recipes/shopping_cart/', bulk_ids, client),
+            ('download', 'get', '/api/recipes/download_shopping_cart/', None,
+             client),
+            ('users-list', 'get', '/api/users/', None, anonymous),
+            ('users-list', 'post', '/api/users/', {
+                'email': 'cook@example.com',
+                'username': 'cook',
+                'first_name': 'Новый',
+                'last_name': 'Повар',
+                'password': PASSWORD,
+            }, anonymous),
+            ('users-detail', 'get', f'/api/users/{author.id}/', None,
+             client),
+            ('users-me', 'get', '/api/users/me/', None, client),
+            ('users-set-password', 'post', '/api/users/set_password/', {
+                'current_password': PASSWORD, 'new_password': PASSWORD,
+            }, client),
+            ('users-activation', 'post', '/api/users/activation/', {},
+             anonymous),
+            ('users-resend-activation', 'post',
+             '/api/users/resend_activation/', {}, anonymous),
+            ('users-reset-password', 'post', '/api/users/reset_password/',
+             {}, anonymous),
+            ('users-reset-password-confirm', 'post',
+             '/api/users/reset_password_confirm/', {}, anonymous),
+            ('users-set-username', 'post', '/api/users/set_username/', {},
+             client),
+            ('users-reset-username', 'post', '/api/users/reset_username/',
+             {}, anonymous),
+            ('users-reset-username-confirm', 'post',
+             '/api/users/reset_username_confirm/', {}, anonymous),
+            ('subscriptions-list', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, client),
+            ('subscriptions-detail', 'delete',
+             f'/api/users/subscriptions/{followed_id}/', None, client),
+            ('subscriptions-delete', 'delete',
+             '/api/users/subscriptions/delete/', None, client),
+            ('following-list', 'post',
+             f'/api/users/{new_author.id}/subscribe/', None, client),
+            ('following-delete', 'delete',
+             f'/api/users/{followed_id}/subscribe/', None, client),
+            ('following-detail', 'delete',
+             f'/api/users/{followed_id}/subscribe/{followed_id}/', None,
+             client),
+            ('login', 'post', '/api/auth/token/login/', {
+                'email': user.email, 'password': PASSWORD,
+            }, anonymous),
+            ('logout', 'post', '/api/auth/token/logout/', None, client),
+        )
+
+    def check_coverage(self, scenarios):
+        routes = set(route_names(recipes_urls.urlpatterns))
+        routes |= set(route_names(users_urls.urlpatterns))
+        missing = routes - {scenario[0] for scenario in scenarios}
+        if missing:
+            raise CommandError(
+                'Нет сценариев для маршрутов: ' + ', '.join(sorted(missing))
+            )
+
+    def request(self, client, method, path, data):
+        """Запрос в точке сохранения, которая затем откатывается."""
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        sid = transaction.savepoint()
+        try:
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                duration = time.perf_counter() - started
+        finally:
+            transaction.savepoint_rollback(sid)
+        if response.status_code >= 500:
+            raise CommandError(
+                f'{method.upper()} {path}: ответ {response.status_code}'
+            )
+        return duration, queries, response.status_code
+
+    def measure(self, client, method, path, data, requests, warmup):
+        for _ in range(warmup):
+            self.request(client, method, path, data)
+        durations, queries = [], []
+        for _ in range(requests):
+            duration, query_count, status = self.request(
+                client, method, path, data
+            )
+            durations.append(duration * 1000)
+            queries.append(query_count)
+        tracemalloc.start()
+        try:
+            self.request(client, method, path, data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'status': status,
+            'p50_ms': round(percentile(durations, 0.5), 2),
+            'p95_ms': round(percentile(durations, 0.95), 2),
+            'p99_ms': round(percentile(durations, 0.99), 2),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"маршрут":<42}{"код":>5}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"SQL":>6}{"КиБ":>9}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<42}{result["status"]:>5}{result["p50_ms"]:>9}'
+                f'{result["p95_ms"]:>9}{result["p99_ms"]:>9}'
+                f'{result["queries"]:>6}{result["peak_kib"]:>9}'
+            )
+
+    def regressions(self, results, baseline, tolerance):
+        """Число запросов к БД не должно расти вовсе, задержка p95 и
+        память — больше чем на tolerance и на MIN_DELTA."""
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: SQL-запросов {result["queries"]}, '
+                    f'было {expected["queries"]}'
+                )
+            for metric, min_delta in MIN_DELTA.items():
+                if result[metric] > max(
+                    expected[metric] * (1 + tolerance),
+                    expected[metric] + min_delta
+                ):
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]}, '
+                        f'было {expected[metric]}'
+                    )
+        return regressions
@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import fan_out_recipe, get_feed_ids, get_feed_ids_on_read
+from recipes.models import Recipe, Timeline
+from users.models import Follow, User
+
+
+class Rollback(Exception):
+    pass
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок с рассылкой при записи и сборку ленты '
+        'при чтении на синтетических данных. Все данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--followers', type=int, default=500)
+        parser.add_argument('--recipes-per-author', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(**options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, authors, followers, recipes_per_author, repeat, **options):
+        prefix = f'feed-bench-{time.time_ns()}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}-{number}',
+                 email=f'{prefix}-{number}@example.com')
+            for number in range(authors + followers)
+        )
+        users = list(
+            User.objects.filter(username__startswith=prefix).order_by('id')
+        )
+        author_users, follower_users = users[:authors], users[authors:]
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'{prefix}-{number}', text='-',
+                   cooking_time=1, image='recipes/images/bench.png')
+            for author in author_users
+            for number in range(recipes_per_author)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=follower, author=author)
+            for follower in follower_users
+            for author in author_users
+        )
+        User.objects.filter(pk__in=[a.pk for a in author_users]).update(
+            followers_count=followers
+        )
+        reader = follower_users[0]
+        recipe_ids = get_feed_ids_on_read(reader.id)
+        Timeline.objects.bulk_create(
+            Timeline(user_id=follower.id, recipe_ids=recipe_ids)
+            for follower in follower_users
+        )
+
+        author = author_users[0]
+        recipe = Recipe.objects.create(
+            author=author, name=f'{prefix}-new', text='-', cooking_time=1,
+            image='recipes/images/bench.png'
+        )
+        write_ms = timed(lambda: fan_out_recipe(recipe.id, author.id), 5)
+        push_read_ms = timed(lambda: get_feed_ids(reader.id), repeat)
+        pull_read_ms = timed(lambda: get_feed_ids_on_read(reader.id), repeat)
+
+        self.stdout.write(
+            f'Авторов: {authors}, подписчиков у каждого: {followers}, '
+            f'рецептов у автора: {recipes_per_author}'
+        )
+        self.stdout.write(
+            f'Рассылка при записи: публикация {write_ms:.1f} мс, '
+            f'чтение ленты {push_read_ms:.2f} мс'
+        )
+        self.stdout.write(
+            f'Сборка при чтении:   публикация 0.0 мс, '
+            f'чтение ленты {pull_read_ms:.2f} мс'
+        )
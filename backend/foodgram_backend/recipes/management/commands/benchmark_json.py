@@ -0,0 +1,109 @@
+import base64
+import io
+import json
+import os
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser, orjson
+from api.renderers import FastJSONRenderer
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.serializers import RecipeSerializer
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает FastJSONRenderer и FastJSONParser со стандартными '
+        'JSONRenderer и JSONParser на странице списка рецептов и на теле '
+        'запроса создания рецепта с картинкой в base64.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=20)
+        parser.add_argument('--image-kib', type=int, default=1024)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def compare(self, title, standard, fast, repeat):
+        with override_settings(FAST_JSON=True):
+            expected = standard()
+            actual = fast()
+            standard_ms = timed(standard, repeat)
+            fast_ms = timed(fast, repeat)
+        if actual != expected:
+            raise CommandError(f'{title}: результаты различаются.')
+        self.stdout.write(
+            f'{title}: json {standard_ms:.2f} мс, orjson {fast_ms:.2f} мс, '
+            f'в {standard_ms / fast_ms:.1f} раза быстрее'
+        )
+
+    def list_page(self, recipes):
+        request = RequestFactory().get('/api/recipes/', HTTP_HOST='localhost')
+        request.user = AnonymousUser()
+        recipe_list = list(
+            Recipe.objects.with_related().with_user_flags(
+                request.user
+            ).order_by('-id')[:recipes]
+        )
+        if not recipe_list:
+            raise CommandError('Нет рецептов; запустите seed_benchmark.')
+        return {
+            'count': len(recipe_list),
+            'next': None,
+            'previous': None,
+            'results': RecipeSerializer(
+                recipe_list, many=True,
+                context={'request': request, 'image_rendition': 'list'}
+            ).data
+        }
+
+    def create_payload(self, ingredients, image_kib):
+        return json.dumps({
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True
+                )[:ingredients]
+            ],
+            'tags': list(Tag.objects.values_list('id', flat=True)),
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                os.urandom(image_kib * 1024)
+            ).decode(),
+            'name': 'Борщ с пампушками',
+            'text': 'Сварить бульон, добавить свёклу и капусту. ' * 20,
+            'cooking_time': 90
+        }, ensure_ascii=False).encode()
+
+    def handle(self, *args, recipes, ingredients, image_kib, repeat,
+               **options):
+        if orjson is None:
+            raise CommandError('orjson не установлен.')
+
+        page = self.list_page(recipes)
+        self.compare(
+            f'Страница из {len(page["results"])} рецептов',
+            lambda: JSONRenderer().render(page),
+            lambda: FastJSONRenderer().render(page),
+            repeat
+        )
+
+        body = self.create_payload(ingredients, image_kib)
+        self.compare(
+            f'Создание рецепта, {len(body) // 1024} КиБ',
+            lambda: JSONParser().parse(io.BytesIO(body)),
+            lambda: FastJSONParser().parse(io.BytesIO(body)),
+            repeat
+        )
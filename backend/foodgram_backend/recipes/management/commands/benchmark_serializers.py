@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializer, ShortRecipeSerializer
+from users.models import Follow, User
+
+
+def render(serializer_class, recipes, context):
+    return JSONRenderer().render(
+        serializer_class(recipes, many=True, context=context).data
+    )
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает быстрый путь RecipeSerializer и ShortRecipeSerializer '
+        'с DRF: ответы должны совпадать байт в байт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, recipes, repeat, **options):
+        user_id = Follow.objects.values('user').annotate(
+            follows=Count('id')
+        ).order_by('-follows').values_list('user', flat=True).first()
+        user = User.objects.get(pk=user_id) if user_id else AnonymousUser()
+        request = RequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost'
+        )
+        request.user = user
+        context = {'request': request, 'image_rendition': 'list'}
+        recipe_list = list(
+            Recipe.objects.with_related().with_user_flags(user).order_by(
+                '-id'
+            )[:recipes]
+        )
+        if not recipe_list:
+            raise CommandError('Нет рецептов; запустите seed_benchmark.')
+
+        for serializer_class in (RecipeSerializer, ShortRecipeSerializer):
+            with override_settings(FAST_READ_SERIALIZERS=False):
+                expected = render(serializer_class, recipe_list, context)
+                drf_ms = timed(
+                    lambda: render(serializer_class, recipe_list, context),
+                    repeat
+                )
+            with override_settings(FAST_READ_SERIALIZERS=True):
+                actual = render(serializer_class, recipe_list, context)
+                fast_ms = timed(
+                    lambda: render(serializer_class, recipe_list, context),
+                    repeat
+                )
+            if actual != expected:
+                raise CommandError(
+                    f'{serializer_class.__name__}: ответы различаются.'
+                )
+            self.stdout.write(
+                f'{serializer_class.__name__}, {len(recipe_list)} рецептов: '
+                f'DRF {drf_ms:.2f} мс, быстрый путь {fast_ms:.2f} мс, '
+                f'в {drf_ms / fast_ms:.1f} раза быстрее; '
+                f'ответы совпадают ({len(actual)} байт)'
+            )
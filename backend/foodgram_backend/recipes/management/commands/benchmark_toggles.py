@@ -0,0 +1,187 @@
+import http.client
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import User
+
+SERVER_START_TIMEOUT = 30
+
+
+def toggle_paths(user):
+    """Избранное, список покупок и подписка: по паре POST и DELETE, так
+    что после прогона данные остаются прежними."""
+    recipe = Recipe.objects.exclude(favorite_recipe__user=user).exclude(
+        shopping_cart_recipe__user=user
+    ).order_by('-id').values_list('id', flat=True).first()
+    author = User.objects.exclude(following__user=user).exclude(
+        pk=user.pk
+    ).order_by('-id').values_list('id', flat=True).first()
+    if recipe is None or author is None:
+        raise CommandError(f'Для {user} нечего переключать.')
+    return [
+        f'/api/recipes/{recipe}/favorite/',
+        f'/api/recipes/{recipe}/shopping_cart/',
+        f'/api/users/{author}/subscribe/',
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_commands(port, workers, threads):
+    """WSGI — gunicorn с потоками и синхронными DRF-view, ASGI — uvicorn
+    с асинхронными переключателями."""
+    return {
+        'wsgi': (
+            'gunicorn',
+            ('foodgram_backend.wsgi:application',
+             '--bind', f'127.0.0.1:{port}',
+             '--worker-class', 'gthread',
+             '--workers', str(workers),
+             '--threads', str(threads)),
+            {'ASYNC_TOGGLES': 'False'},
+        ),
+        'asgi': (
+            'uvicorn',
+            ('foodgram_backend.asgi:application',
+             '--host', '127.0.0.1',
+             '--port', str(port),
+             '--workers', str(workers),
+             '--no-access-log'),
+            {'ASYNC_TOGGLES': 'True'},
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность переключателей избранного, '
+        'списка покупок и подписок под gunicorn (WSGI, DRF-view) и uvicorn '
+        '(ASGI, асинхронные view). Клиенты шлют запросы параллельно по '
+        'HTTP; каждый POST отменяется DELETE, так что данные не меняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, clients, rounds, workers, **options):
+        for module in ('gunicorn', 'uvicorn'):
+            if importlib.util.find_spec(module) is None:
+                raise CommandError(f'Для замера нужен {module}.')
+        if connection.vendor == 'sqlite':
+            self.stderr.write(
+                'SQLite пропускает одну запись за раз и отвечает «database '
+                'is locked» на конкурентные транзакции: сравнение имеет '
+                'смысл на PostgreSQL.'
+            )
+        users = list(
+            User.objects.filter(is_active=True).order_by('id')[:clients]
+        )
+        if len(users) < clients:
+            raise CommandError('Мало пользователей; запустите seed_benchmark.')
+        plans = [
+            (Token.objects.get_or_create(user=user)[0].key, toggle_paths(user))
+            for user in users
+        ]
+        connection.close()
+
+        port = free_port()
+        results = {}
+        for mode, (module, arguments, env) in server_commands(
+            port, workers, clients
+        ).items():
+            server = subprocess.Popen(
+                (sys.executable, '-m', module, *arguments),
+                cwd=settings.BASE_DIR,
+                env={**os.environ, **env},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                self.wait_for_server(server, port)
+                results[mode] = self.run(port, plans, rounds)
+            finally:
+                server.terminate()
+                server.wait()
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode}: {result["requests"]} запросов от {clients} '
+                f'клиентов за {result["seconds"]:.2f} с, '
+                f'{result["requests"] / result["seconds"]:.0f} запросов/с, '
+                f'p50 {result["p50_ms"]:.1f} мс, '
+                f'p95 {result["p95_ms"]:.1f} мс, '
+                f'ошибок {result["errors"]}'
+            )
+        self.stdout.write(
+            'Пропускная способность ASGI к WSGI: '
+            f'{results["wsgi"]["seconds"] / results["asgi"]["seconds"]:.2f}'
+        )
+
+    def wait_for_server(self, server, port):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Сервер не запустился.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 0.1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('Сервер не ответил за отведённое время.')
+
+    def run(self, port, plans, rounds):
+        def client_session(plan):
+            key, paths = plan
+            headers = {'Host': 'localhost', 'Authorization': f'Token {key}'}
+            client = http.client.HTTPConnection('127.0.0.1', port)
+            timings = []
+            try:
+                for _ in range(rounds):
+                    for path in paths:
+                        for method in ('POST', 'DELETE'):
+                            started = time.perf_counter()
+                            client.request(method, path, headers=headers)
+                            response = client.getresponse()
+                            response.read()
+                            timings.append((
+                                time.perf_counter() - started,
+                                response.status
+                            ))
+            finally:
+                client.close()
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(plans)) as executor:
+            timings = [
+                timing
+                for session in executor.map(client_session, plans)
+                for timing in session
+            ]
+        seconds = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in timings)
+        return {
+            'requests': len(timings),
+            'seconds': seconds,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+            'errors': sum(status >= 400 for _, status in timings),
+        }
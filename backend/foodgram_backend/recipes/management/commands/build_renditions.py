@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит уменьшенные копии и WebP-варианты картинок рецептов, '
+        'у которых их ещё нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions={})
+        built = 0
+        for recipe_id, image_name in recipes.values_list('id', 'image'):
+            try:
+                build_renditions(recipe_id, image_name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                continue
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Подготовлены картинки для рецептов: {built}'
+        ))
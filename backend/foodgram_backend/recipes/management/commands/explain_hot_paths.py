@@ -0,0 +1,193 @@
+import json
+import logging
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from recipes.models import Ingredient, Recipe
+from .benchmark_api import Command as BenchmarkCommand, Rollback
+
+EXPLAINED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+# SQLite: «SCAN recipes_recipe» без индекса; «SCAN ... USING INDEX» и
+# виртуальные таблицы полнотекстового поиска полным чтением не считаются.
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+SQLITE_LIMIT = re.compile(r'\bLIMIT\b')
+
+
+def prefix_search_queries():
+    """Поиск по началу названия: фильтр ингредиентов и поиск в админке."""
+    return (
+        ('ingredients istartswith',
+         Ingredient.objects.filter(name__istartswith='са')[:20]),
+        ('admin recipes istartswith',
+         Recipe.objects.filter(name__istartswith='са').order_by('-id')[:100]),
+    )
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов каждого маршрута recipes и users и '
+        'для поиска по началу названия. Завершается с ошибкой, если план '
+        'читает целиком таблицу, в которой больше --min-rows строк. '
+        'COUNT(*) постраничной пагинации не проверяется: он читает всю '
+        'выборку при любом индексе. План SQLite приблизителен, проверка '
+        'рассчитана на PostgreSQL. Изменения данных откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000)
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать план каждого запроса.'
+        )
+
+    def handle(self, *args, min_rows, verbose_plans, **options):
+        if settings.ASYNC_TOGGLES:
+            raise CommandError('Запустите с ASYNC_TOGGLES=False.')
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.'
+            )
+        self.min_rows = min_rows
+        self.verbose_plans = verbose_plans
+        self.table_rows = {}
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                # Без кэша каждый маршрут доходит до базы.
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    MEDIA_ROOT=media_root,
+                    CACHES={
+                        alias: {
+                            'BACKEND': 'django.core.cache.backends.dummy.'
+                                       'DummyCache'
+                        }
+                        for alias in settings.CACHES
+                    }
+                ):
+                    problems = self.explain_all()
+        finally:
+            request_logger.setLevel(level)
+        if problems:
+            raise CommandError(
+                'Полное чтение больших таблиц:\n' + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS('Полных чтений нет.'))
+
+    def explain_all(self):
+        problems = []
+        try:
+            with transaction.atomic():
+                scenarios = self.scenarios()
+                self.check_coverage(scenarios)
+                for name, method, path, data, client in scenarios:
+                    statements = self.capture(client, method, path, data)
+                    problems.extend(self.check_plans(
+                        f'{method.upper()} {path}', statements
+                    ))
+                for name, queryset in prefix_search_queries():
+                    problems.extend(self.check_plans(
+                        name, [queryset.query.sql_with_params()]
+                    ))
+                raise Rollback
+        except Rollback:
+            pass
+        return problems
+
+    def capture(self, client, method, path, data):
+        """Запросы к базе, которые выполняет маршрут."""
+        statements = []
+
+        def collect(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith(EXPLAINED):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        sid = transaction.savepoint()
+        try:
+            with connection.execute_wrapper(collect):
+                response = getattr(client, method)(path, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+        finally:
+            transaction.savepoint_rollback(sid)
+        return statements
+
+    def check_plans(self, name, statements):
+        problems = []
+        for sql, params in statements:
+            if sql.lstrip().upper().startswith('SELECT COUNT(*)'):
+                continue
+            if connection.vendor == 'postgresql':
+                plan, tables = self.explain_postgresql(sql, params)
+            else:
+                plan, tables = self.explain_sqlite(sql, params)
+            if self.verbose_plans:
+                self.stdout.write(f'{name}\n{sql}\n{params}\n{plan}\n')
+            for table in tables:
+                rows = self.rows(table)
+                if rows > self.min_rows:
+                    problems.append(
+                        f'{name}: {table} ({rows} строк) в {sql[:200]}'
+                    )
+        return problems
+
+    def explain_postgresql(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables = []
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                tables.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', ()))
+        return json.dumps(plan, indent=2, ensure_ascii=False), tables
+
+    def explain_sqlite(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+        plan = '\n'.join(details)
+        # Чтение по rowid с LIMIT без сортировки во временном B-дереве
+        # останавливается на первых строках.
+        if SQLITE_LIMIT.search(sql) and 'USE TEMP B-TREE' not in plan:
+            return plan, []
+        tables = []
+        for detail in details:
+            match = SQLITE_SCAN.match(detail)
+            if match:
+                tables.append(match.group(1))
+        return plan, tables
+
+    def rows(self, table):
+        """Число строк таблицы: оценка планировщика в PostgreSQL, точное
+        в SQLite. Для псевдонимов подзапросов (U0) возвращает 0."""
+        if table not in self.table_rows:
+            rows = 0
+            if table in connection.introspection.table_names():
+                with connection.cursor() as cursor:
+                    if connection.vendor == 'postgresql':
+                        cursor.execute(
+                            'SELECT reltuples::bigint FROM pg_class '
+                            'WHERE oid = %s::regclass',
+                            (table,)
+                        )
+                    else:
+                        cursor.execute(
+                            f'SELECT COUNT(*) FROM '
+                            f'{connection.ops.quote_name(table)}'
+                        )
+                    rows = cursor.fetchone()[0]
+            self.table_rows[table] = rows
+        return self.table_rows[table]
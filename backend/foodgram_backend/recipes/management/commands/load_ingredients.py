@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.versions import bump_model_version
+from recipes.models import Ingredient
+
+DEFAULT_PATH = (
+    Path(settings.BASE_DIR).parent.parent / 'data' / 'ingredients.csv'
+)
+JSON_READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file):
+    """Построчно разбирает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise CommandError('JSON-файл должен содержать массив.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_READ_SIZE)
+            if not chunk:
+                raise CommandError('JSON-файл оборвался на середине.')
+            buffer += chunk
+            continue
+        yield item['name'].strip(), item['measurement_unit'].strip()
+        buffer = buffer[end:]
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON пачками. Уже существующие '
+        'пары «название — единица измерения» пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+            help='Путь к ingredients.csv или ingredients.json.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной вставке.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, какие ингредиенты будут добавлены.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Неподдерживаемый формат файла: {path.name}')
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+
+        with path.open(encoding='utf-8-sig', newline='') as file:
+            rows = reader(file)
+            if options['dry_run']:
+                self.diff(rows, options['verbosity'])
+                return
+            self.load(rows, options['chunk_size'])
+
+    def diff(self, rows, verbosity):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        in_file = set(rows)
+        new = sorted(in_file - existing)
+        missing = sorted(existing - in_file)
+        if verbosity > 1:
+            for name, measurement_unit in new:
+                self.stdout.write(f'+ {name}, {measurement_unit}')
+            for name, measurement_unit in missing:
+                self.stdout.write(f'- {name}, {measurement_unit}')
+        self.stdout.write(
+            f'Будет добавлено: {len(new)}, уже есть: '
+            f'{len(in_file) - len(new)}, есть только в базе: {len(missing)}'
+        )
+
+    def load(self, rows, chunk_size):
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        processed = 0
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                insert_chunk = self.copy_chunk
+                self.create_copy_table()
+            else:
+                insert_chunk = self.bulk_create_chunk
+            for chunk in chunked(rows, chunk_size):
+                insert_chunk(chunk)
+                processed += len(chunk)
+                self.stdout.write(f'Обработано строк: {processed}')
+        bump_model_version(Ingredient)
+
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено ингредиентов: {created} из {processed} за '
+            f'{elapsed:.2f} с ({processed / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
+
+    def bulk_create_chunk(self, chunk):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in chunk
+            ],
+            ignore_conflicts=True
+        )
+
+    def create_copy_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_load '
+                '(name varchar(200), measurement_unit varchar(50)) '
+                'ON COMMIT DROP'
+            )
+
+    def copy_chunk(self, chunk):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY ingredient_load (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_load '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            cursor.execute('TRUNCATE ingredient_load')
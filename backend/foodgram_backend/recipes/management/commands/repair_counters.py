@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def count_of(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+def repair_counters():
+    with transaction.atomic():
+        recipes = Recipe.objects.update(
+            favorites_count=count_of(Favorite, 'recipe'),
+            in_carts_count=count_of(ShoppingCart, 'recipe'),
+        )
+        users = User.objects.update(
+            recipes_count=count_of(Recipe, 'author'),
+            followers_count=count_of(Follow, 'author'),
+        )
+    return recipes, users
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, списков покупок, рецептов '
+        'и подписчиков по фактическим данным.'
+    )
+
+    def handle(self, *args, **options):
+        recipes, users = repair_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'
+        ))
@@ -0,0 +1,231 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes.management.commands.repair_counters import repair_counters
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagsInRecipe,
+    tags_mask
+)
+from recipes.search import index_recipes
+from users.models import Follow, User
+
+USERS_PER_SCALE = 200
+RECIPES_PER_SCALE = 1000
+BATCH_SIZE = 1000
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F3C245', 'dessert'),
+    ('Суп', '#C1554B', 'soup'),
+    ('Выпечка', '#A0522D', 'bakery'),
+    ('Салат', '#2E8B57', 'salad'),
+    ('Напиток', '#4682B4', 'drink'),
+)
+WORDS = (
+    'домашний', 'быстрый', 'сырный', 'острый', 'летний', 'бабушкин',
+    'пряный', 'лёгкий', 'сливочный', 'запечённый', 'праздничный', 'постный',
+)
+DISHES = (
+    'борщ', 'пирог', 'салат', 'суп', 'омлет', 'плов', 'рагу', 'кекс',
+    'паста', 'каша', 'блины', 'котлеты', 'запеканка', 'смузи', 'хлеб',
+)
+
+
+def zipf_weights(count, exponent=1.1):
+    """Кумулятивные веса, при которых первые элементы встречаются чаще."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт пользователей, рецепты, избранное, списки покупок и '
+        'подписки для нагрузочных замеров. Популярность авторов и рецептов '
+        'распределена по закону Ципфа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1,
+            help=(
+                f'Множитель объёма: {USERS_PER_SCALE} пользователей и '
+                f'{RECIPES_PER_SCALE} рецептов на единицу.'
+            )
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, scale, seed, **options):
+        self.random = random.Random(seed)
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        with transaction.atomic():
+            tag_ids = self.seed_tags()
+            user_ids = self.seed_users(USERS_PER_SCALE * scale)
+            recipe_ids = self.seed_recipes(
+                RECIPES_PER_SCALE * scale, user_ids, tag_ids
+            )
+            follows = self.seed_follows(user_ids)
+            favorites, carts = self.seed_engagement(user_ids, recipe_ids)
+            self.reset_sequences()
+            repair_counters()
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            index_recipes(recipe_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}, '
+            f'подписок: {follows}, в избранном: {favorites}, '
+            f'в списках покупок: {carts}'
+        ))
+
+    def seed_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def seed_users(self, count):
+        first_id = next_id(User)
+        password = make_password('benchmark-password')
+        users = [
+            User(
+                id=user_id,
+                username=f'bench{user_id}',
+                email=f'bench{user_id}@example.com',
+                first_name='Повар',
+                last_name=str(user_id),
+                password=password
+            )
+            for user_id in range(first_id, first_id + count)
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        return [user.id for user in users]
+
+    def seed_recipes(self, count, user_ids, tag_ids):
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.random.shuffle(ingredient_ids)
+        ingredient_weights = zipf_weights(len(ingredient_ids))
+        authors = self.random.choices(
+            user_ids, cum_weights=zipf_weights(len(user_ids)), k=count
+        )
+        first_id = next_id(Recipe)
+        recipes, ingredients, tags = [], [], []
+        for recipe_id, author_id in zip(
+            range(first_id, first_id + count), authors
+        ):
+            recipe_tags = self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+            )
+            recipes.append(Recipe(
+                id=recipe_id,
+                author_id=author_id,
+                name=(
+                    f'{self.random.choice(WORDS).capitalize()} '
+                    f'{self.random.choice(DISHES)} №{recipe_id}'
+                ),
+                text=' '.join(self.random.choices(WORDS + DISHES, k=40)),
+                cooking_time=self.random.randint(5, 180),
+                image='recipes/images/benchmark.png',
+                tags_mask=tags_mask(recipe_tags)
+            ))
+            tags.extend(
+                TagsInRecipe(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in recipe_tags
+            )
+            ingredients.extend(
+                IngredientsInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for ingredient_id in set(self.random.choices(
+                    ingredient_ids,
+                    cum_weights=ingredient_weights,
+                    k=self.random.randint(3, 12)
+                ))
+            )
+        Recipe.objects.bulk_create(recipes, batch_size=BATCH_SIZE)
+        TagsInRecipe.objects.bulk_create(tags, batch_size=BATCH_SIZE)
+        IngredientsInRecipe.objects.bulk_create(
+            ingredients, batch_size=BATCH_SIZE
+        )
+        return [recipe.id for recipe in recipes]
+
+    def heavy_tail(self, scale, limit):
+        """Большинству пользователей мало, немногим — очень много."""
+        return min(int(self.random.paretovariate(1.2) * scale) - scale, limit)
+
+    def seed_follows(self, user_ids):
+        weights = zipf_weights(len(user_ids))
+        follows = []
+        for user_id in user_ids:
+            authors = set(self.random.choices(
+                user_ids, cum_weights=weights,
+                k=self.heavy_tail(3, len(user_ids) // 2)
+            ))
+            authors.discard(user_id)
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in authors
+            )
+        Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE)
+        return len(follows)
+
+    def seed_engagement(self, user_ids, recipe_ids):
+        popular = list(recipe_ids)
+        self.random.shuffle(popular)
+        weights = zipf_weights(len(popular))
+        favorites, carts = [], []
+        for user_id in user_ids:
+            favorites.extend(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in set(self.random.choices(
+                    popular, cum_weights=weights,
+                    k=self.heavy_tail(5, len(popular) // 2)
+                ))
+            )
+            if self.random.random() < 0.3:
+                carts.extend(
+                    ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                    for recipe_id in set(self.random.choices(
+                        popular, cum_weights=weights,
+                        k=self.random.randint(1, 10)
+                    ))
+                )
+        Favorite.objects.bulk_create(favorites, batch_size=BATCH_SIZE)
+        ShoppingCart.objects.bulk_create(carts, batch_size=BATCH_SIZE)
+        return len(favorites), len(carts)
+
+    def reset_sequences(self):
+        """Id заданы явно, поэтому последовательности PostgreSQL
+        сдвигаются за последний созданный id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(),
+            (User, Recipe, TagsInRecipe, IngredientsInRecipe, Follow,
+             Favorite, ShoppingCart)
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
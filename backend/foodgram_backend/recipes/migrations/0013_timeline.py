@@ -0,0 +1,22 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_engagement_counters'),
+        ('recipes', '0012_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Timeline',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline', serialize=False, to='users.user', verbose_name='Подписчик')),
+                ('recipe_ids', models.JSONField(default=list, verbose_name='Рецепты в ленте, от новых к старым')),
+            ],
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+POSTGRESQL_CREATE = [
+    '''
+    CREATE TABLE recipes_recipe_search (
+        recipe_id integer PRIMARY KEY
+            REFERENCES recipes_recipe (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX recipes_recipe_search_document_idx
+    ON recipes_recipe_search USING gin (document)
+    ''',
+    '''
+    INSERT INTO recipes_recipe_search (recipe_id, document)
+    SELECT r.id,
+        setweight(to_tsvector('russian', r.name), 'A')
+        || setweight(to_tsvector(
+            'russian', COALESCE(string_agg(i.name, ' '), '')
+        ), 'B')
+        || setweight(to_tsvector('russian', r.text), 'C')
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsinrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+    GROUP BY r.id, r.name, r.text
+    ''',
+]
+
+SQLITE_CREATE = [
+    '''
+    CREATE VIRTUAL TABLE recipes_recipe_search
+    USING fts5(name, ingredients, text)
+    ''',
+    '''
+    INSERT INTO recipes_recipe_search (rowid, name, ingredients, text)
+    SELECT r.id,
+        replace(replace(r.name, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(
+            COALESCE(group_concat(i.name, ' '), ''), 'ё', 'е'
+        ), 'Ё', 'Е'),
+        replace(replace(r.text, 'ё', 'е'), 'Ё', 'Е')
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsinrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+    GROUP BY r.id, r.name, r.text
+    ''',
+]
+
+
+def create_search_table(apps, schema_editor):
+    statements = {
+        'postgresql': POSTGRESQL_CREATE,
+        'sqlite': SQLITE_CREATE,
+    }.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:17
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+TAG_MASK_BITS = 62
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TagsInRecipe = apps.get_model('recipes', 'TagsInRecipe')
+    rows = TagsInRecipe.objects.filter(
+        tag_id__lte=TAG_MASK_BITS
+    ).order_by('recipe_id').values_list('recipe_id', 'tag_id').iterator()
+    recipes = []
+    for recipe_id, group in groupby(rows, key=lambda row: row[0]):
+        mask = 0
+        for _, tag_id in group:
+            mask |= 1 << tag_id
+        recipes.append(Recipe(pk=recipe_id, tags_mask=mask))
+    Recipe.objects.bulk_update(recipes, ('tags_mask',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
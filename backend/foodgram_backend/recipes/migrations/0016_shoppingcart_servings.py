@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:46
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Во сколько раз увеличить количество ингредиентов'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Поиск по началу названия (istartswith) сравнивает UPPER(name) через
+# LIKE; обычный btree-индекс для LIKE в PostgreSQL подходит только с
+# классом операторов text_pattern_ops.
+PATTERN_INDEXES = {
+    'ingredient_name_upper_idx': 'recipes_ingredient',
+    'recipe_name_upper_idx': 'recipes_recipe',
+}
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in PATTERN_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} (UPPER(name) text_pattern_ops)'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0016_shoppingcart_servings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shoppingcart_recipe_user_idx'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorite_recipe', to='recipes.recipe', verbose_name='Рецепт, который добавлен в избранное'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredient', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_recipe', to='recipes.recipe', verbose_name='Рецепт, который добавлен в список покупок'),
+        ),
+        migrations.RunPython(
+            create_pattern_indexes, drop_pattern_indexes
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations
+
+
+def rebuild_timelines(apps, schema_editor):
+    """Ленты, созданные рассылкой пустыми, не содержат рецептов авторов,
+    на которых подписчик был подписан раньше. Все ленты строятся заново
+    так же, как их строит чтение в recipes/feed.py."""
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Timeline = apps.get_model('recipes', 'Timeline')
+    Timeline.objects.all().delete()
+    follower_ids = Follow.objects.order_by('user_id').values_list(
+        'user_id', flat=True
+    ).distinct().iterator()
+    timelines = []
+    for user_id in follower_ids:
+        timelines.append(Timeline(
+            user_id=user_id,
+            recipe_ids=list(
+                Recipe.objects.filter(
+                    author__following__user_id=user_id,
+                    author__followers_count__lte=(
+                        settings.FEED_FANOUT_MAX_FOLLOWERS
+                    )
+                ).order_by('-id').values_list(
+                    'id', flat=True
+                )[:settings.FEED_SIZE]
+            )
+        ))
+        if len(timelines) >= 1000:
+            Timeline.objects.bulk_create(timelines)
+            timelines = []
+    Timeline.objects.bulk_create(timelines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_hot_path_indexes'),
+        ('users', '0005_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_timelines, migrations.RunPython.noop),
+    ]
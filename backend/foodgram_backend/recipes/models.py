@@ -1,7 +1,23 @@
+from django.core.exceptions import EmptyResultSet
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import RowNumber
 from django.urls import reverse
 
-from users.models import User
+from users.models import Follow, User
+
+# Теги с id не больше TAG_MASK_BITS хранятся в Recipe.tags_mask битом
+# 1 << id. Знаковый бит BigIntegerField не используется.
+TAG_MASK_BITS = 62
+
+
+def tags_mask(tag_ids):
+    """Битовая маска тегов, которые в неё помещаются."""
+    mask = 0
+    for tag_id in tag_ids:
+        if tag_id <= TAG_MASK_BITS:
+            mask |= 1 << tag_id
+    return mask
 
 
 class Tag(models.Model):
@@ -46,11 +62,104 @@ class Ingredient(models.Model):
         return f'{self.name} - {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Автор, теги и ингредиенты рецепта фиксированным числом запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredientsinrecipe_set',
+                queryset=IngredientsInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного, списка покупок и подписки на автора."""
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            author_is_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user=user, author=models.OuterRef('author')
+                )
+            ),
+        )
+
+    def with_tags(self, tag_ids, match_all=False):
+        """Рецепты хотя бы с одним из тегов или, с match_all, со всеми.
+
+        Проверяется маска в строке рецепта, без JOIN и DISTINCT. Теги,
+        которые не поместились в маску, проверяются подзапросом.
+        """
+        tag_ids = set(tag_ids)
+        mask = tags_mask(tag_ids)
+        conditions = [
+            models.Q(pk__in=TagsInRecipe.objects.filter(
+                tag_id=tag_id
+            ).values('recipe_id'))
+            for tag_id in tag_ids if tag_id > TAG_MASK_BITS
+        ]
+        if mask:
+            conditions.append(
+                models.Q(tags_match=mask) if match_all
+                else ~models.Q(tags_match=0)
+            )
+        if not conditions:
+            return self
+        condition = conditions.pop()
+        for other in conditions:
+            condition = condition & other if match_all else condition | other
+        return self.alias(
+            tags_match=models.F('tags_mask').bitand(mask)
+        ).filter(condition)
+
+    def latest_per_author(self, limit=None):
+        """Не больше limit последних рецептов каждого автора одним запросом.
+
+        Рецепты нумеруются через ROW_NUMBER() OVER (PARTITION BY author),
+        а отбор по номеру делается во внешнем запросе.
+        """
+        ranked = self.annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=models.F('id').desc()
+            )
+        ).order_by()
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return self.none()
+        where = ''
+        if limit is not None:
+            where = ' WHERE ranked.row_number <= %s'
+            params = (*params, limit)
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked{where} '
+            f'ORDER BY ranked.author_id, ranked.row_number',
+            params
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='ingredient',
+        db_index=False,
         verbose_name='Автор рецепта'
     )
     name = models.CharField(max_length=200, verbose_name='Название рецепта')
@@ -58,6 +167,12 @@ class Recipe(models.Model):
         'Картинка',
         upload_to='recipes/images/',
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     text = models.TextField(
         max_length=500,
         verbose_name='Описание рецепта'
@@ -75,6 +190,31 @@ class Recipe(models.Model):
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления в минутах',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Сколько раз добавлен в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Сколько раз добавлен в список покупок'
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Битовая маска тегов'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('name',), name='recipe_name_idx'),
+            models.Index(
+                fields=('author', '-id'), name='recipe_author_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} by {self.author.username}'
@@ -123,6 +263,25 @@ class TagsInRecipe(models.Model):
         return f'{self.tag.name} in {self.recipe.name}'
 
 
+class Timeline(models.Model):
+    """Лента подписчика: id последних рецептов авторов из подписок."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    recipe_ids = models.JSONField(
+        default=list,
+        verbose_name='Рецепты в ленте, от новых к старым'
+    )
+
+    def __str__(self):
+        return f'Лента {self.user}'
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -134,6 +293,7 @@ class Favorite(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='favorite_recipe',
+        db_index=False,
         verbose_name='Рецепт, который добавлен в избранное'
     )
 
@@ -144,6 +304,11 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'), name='favorite_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил в избранное {self.recipe.name}'
@@ -160,8 +325,14 @@ class ShoppingCart(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='shopping_cart_recipe',
+        db_index=False,
         verbose_name='Рецепт, который добавлен в список покупок'
     )
+    servings = models.PositiveSmallIntegerField(
+        default=1,
+        validators=(MinValueValidator(1),),
+        verbose_name='Во сколько раз увеличить количество ингредиентов'
+    )
 
     class Meta:
         constraints = [
@@ -170,6 +341,11 @@ class ShoppingCart(models.Model):
                 name='unique_shoppingcart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'), name='shoppingcart_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил в список покупок {self.recipe.name}'
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import IntegerField, Value
+
+from api.versions import get_versions, model_version_name
+from users.models import Follow
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .response_cache import recipe_version_name
+from .serializers import RecipeSerializer
+
+PAYLOAD_KEY = 'recipe-payload:{recipe_id}:{versions}:{rendition}:{base_url}'
+FAVORITED, IN_CART, SUBSCRIBED = range(3)
+
+
+def _neutral(recipe):
+    """Рецепт глазами анонима: флаги пользователя ложны."""
+    recipe.is_favorited = False
+    recipe.is_in_shopping_cart = False
+    recipe.author_is_subscribed = False
+    return recipe
+
+
+def recipe_payloads(recipe_ids, context):
+    """Данные RecipeSerializer без флагов пользователя по id рецептов.
+
+    Ключ кэша — id рецепта, версии рецепта, тегов и ингредиентов, вариант
+    картинки и адрес сайта, от которого строятся ссылки. Недостающие
+    рецепты читаются из базы одной выборкой. Возвращает словарь
+    {id: данные}; удалённых рецептов в нём нет.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}
+    tags_version, ingredients_version, *versions = get_versions([
+        model_version_name(Tag),
+        model_version_name(Ingredient),
+        *map(recipe_version_name, recipe_ids),
+    ])
+    base_url = context['request'].build_absolute_uri('/')
+    keys = {
+        recipe_id: PAYLOAD_KEY.format(
+            recipe_id=recipe_id,
+            versions=f'{version}.{tags_version}.{ingredients_version}',
+            rendition=context.get('image_rendition'),
+            base_url=base_url
+        )
+        for recipe_id, version in zip(recipe_ids, versions)
+    }
+    cache = caches[settings.RESPONSE_CACHE_ALIAS]
+    cached = cache.get_many(keys.values())
+    payloads = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in payloads
+    ]
+    if missing:
+        recipes = Recipe.objects.with_related().filter(pk__in=missing)
+        serializer = RecipeSerializer(
+            [_neutral(recipe) for recipe in recipes],
+            many=True,
+            context=context
+        )
+        fresh = {payload['id']: dict(payload) for payload in serializer.data}
+        cache.set_many(
+            {keys[recipe_id]: payload for recipe_id, payload in fresh.items()},
+            settings.RESPONSE_CACHE_TIMEOUT
+        )
+        payloads.update(fresh)
+    return payloads
+
+
+def user_flags(user, payloads):
+    """Избранное, список покупок и подписки пользователя среди рецептов
+    и авторов из payloads одним запросом UNION ALL."""
+    recipe_ids = [payload['id'] for payload in payloads]
+    author_ids = {payload['author']['id'] for payload in payloads}
+    rows = Favorite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list(
+        Value(FAVORITED, output_field=IntegerField()), 'recipe_id'
+    ).union(
+        ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list(
+            Value(IN_CART, output_field=IntegerField()), 'recipe_id'
+        ),
+        Follow.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list(
+            Value(SUBSCRIBED, output_field=IntegerField()), 'author_id'
+        ),
+        all=True
+    )
+    flags = (set(), set(), set())
+    for kind, object_id in rows:
+        flags[kind].add(object_id)
+    return flags
+
+
+def user_recipe_payloads(user, recipe_ids, context):
+    """Данные рецептов для пользователя: закэшированная общая часть и
+    флаги из user_flags. Удалённые рецепты пропускаются."""
+    payloads = recipe_payloads(recipe_ids, context)
+    ordered = [
+        payloads[recipe_id] for recipe_id in recipe_ids
+        if recipe_id in payloads
+    ]
+    if not ordered or user.is_anonymous:
+        return ordered
+    favorited, in_cart, subscribed = user_flags(user, ordered)
+    return [
+        {
+            **payload,
+            'author': {
+                **payload['author'],
+                'is_subscribed': payload['author']['id'] in subscribed,
+            },
+            'is_in_shopping_cart': payload['id'] in in_cart,
+            'is_favorited': payload['id'] in favorited,
+        }
+        for payload in ordered
+    ]
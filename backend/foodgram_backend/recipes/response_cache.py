@@ -0,0 +1,80 @@
+from django.db import transaction
+
+from api.versions import bump_versions
+from .models import Recipe, Tag
+from .search import index_recipes
+from .shopping_cart import bump_cart_versions_for_recipes
+
+RECIPES_VERSION = 'recipes:list'
+
+
+def author_version_name(author_id):
+    return f'recipes:author:{author_id}'
+
+
+def tag_version_name(slug):
+    return f'recipes:tag:{slug}'
+
+
+def recipe_version_name(recipe_id):
+    return f'recipes:recipe:{recipe_id}'
+
+
+def invalidate_recipe(recipe_id, author_id=None, tag_slugs=()):
+    """Сдвигает версии рецепта, его автора, его тегов и общего списка."""
+    if author_id is None:
+        author_id = Recipe.objects.filter(pk=recipe_id).values_list(
+            'author_id', flat=True
+        ).first()
+    tag_slugs = {
+        *tag_slugs,
+        *Tag.objects.filter(
+            tagsinrecipe__recipe_id=recipe_id
+        ).values_list('slug', flat=True)
+    }
+    names = [
+        RECIPES_VERSION,
+        recipe_version_name(recipe_id),
+        *map(tag_version_name, tag_slugs)
+    ]
+    if author_id is not None:
+        names.append(author_version_name(author_id))
+    bump_versions(names)
+
+
+def invalidate_author(author_id):
+    """Данные автора выводятся в каждом его рецепте, поэтому сдвигаются
+    версии всех его рецептов и их тегов."""
+    bump_versions([
+        RECIPES_VERSION,
+        author_version_name(author_id),
+        *map(
+            recipe_version_name,
+            Recipe.objects.filter(author_id=author_id).values_list(
+                'id', flat=True
+            )
+        ),
+        *map(
+            tag_version_name,
+            Tag.objects.filter(
+                tagsinrecipe__recipe__author_id=author_id
+            ).values_list('slug', flat=True).distinct()
+        )
+    ])
+
+
+def invalidate_recipe_contents(recipe_ids, tag_slugs=()):
+    """Ингредиенты или теги рецептов изменены удалением пачкой, мимо
+    сигналов post_delete. После фиксации транзакции сдвигает версии
+    ответов и списков покупок и пересобирает поисковые документы."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def refresh():
+        for recipe_id in recipe_ids:
+            invalidate_recipe(recipe_id, tag_slugs=tag_slugs)
+        bump_cart_versions_for_recipes(recipe_ids)
+        index_recipes(recipe_ids)
+
+    transaction.on_commit(refresh)
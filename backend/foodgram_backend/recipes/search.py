@@ -0,0 +1,129 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+# Документ рецепта: название, названия ингредиентов и описание.
+# Веса задают порядок важности при ранжировании.
+_DOCUMENT_SQL = '''
+    SELECT r.id, r.name, COALESCE({ingredients}, '') AS ingredients, r.text
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsinrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+    WHERE r.id IN ({placeholders})
+    GROUP BY r.id, r.name, r.text
+'''
+
+_POSTGRESQL_INDEX_SQL = '''
+    INSERT INTO {table} (recipe_id, document)
+    SELECT id,
+        setweight(to_tsvector('russian', name), 'A')
+        || setweight(to_tsvector('russian', ingredients), 'B')
+        || setweight(to_tsvector('russian', text), 'C')
+    FROM ({document}) AS document (id, name, ingredients, text)
+    ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document
+'''
+_POSTGRESQL_MATCH_SQL = (
+    f"SELECT recipe_id FROM {SEARCH_TABLE} "
+    f"WHERE document @@ plainto_tsquery('russian', %s)"
+)
+_POSTGRESQL_RANK_SQL = (
+    f"SELECT ts_rank(document, plainto_tsquery('russian', %s)) "
+    f"FROM {SEARCH_TABLE} WHERE recipe_id = recipes_recipe.id"
+)
+
+# unicode61 не считает «ё» вариантом «е», поэтому в SQLite буква
+# заменяется и в документе, и в запросе.
+_SQLITE_INDEX_SQL = '''
+    INSERT INTO {table} (rowid, name, ingredients, text)
+    SELECT id, {name}, {ingredients}, {text}
+    FROM ({document})
+'''
+_SQLITE_FOLD_YO_SQL = "replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+_SQLITE_MATCH_SQL = (
+    f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+)
+_SQLITE_RANK_SQL = (
+    f'SELECT -bm25({SEARCH_TABLE}, 10.0, 4.0, 1.0) FROM {SEARCH_TABLE} '
+    f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = recipes_recipe.id'
+)
+
+
+def index_recipes(recipe_ids):
+    """Пересобирает поисковые документы рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                _POSTGRESQL_INDEX_SQL.format(
+                    table=SEARCH_TABLE,
+                    document=_DOCUMENT_SQL.format(
+                        ingredients="string_agg(i.name, ' ')",
+                        placeholders=placeholders
+                    )
+                ),
+                recipe_ids
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+            cursor.execute(
+                _SQLITE_INDEX_SQL.format(
+                    table=SEARCH_TABLE,
+                    name=_SQLITE_FOLD_YO_SQL.format(column='name'),
+                    ingredients=_SQLITE_FOLD_YO_SQL.format(
+                        column='ingredients'
+                    ),
+                    text=_SQLITE_FOLD_YO_SQL.format(column='text'),
+                    document=_DOCUMENT_SQL.format(
+                        ingredients="group_concat(i.name, ' ')",
+                        placeholders=placeholders
+                    )
+                ),
+                recipe_ids
+            )
+
+
+def unindex_recipe(recipe_id):
+    """Удаляет документ рецепта. В PostgreSQL это делает внешний ключ."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', (recipe_id,)
+            )
+
+
+def _fts5_query(query):
+    """Каждое слово запроса ищется как префикс: стемминга в FTS5 нет."""
+    words = re.findall(r'\w+', query.replace('ё', 'е').replace('Ё', 'Е'))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью в search_rank."""
+    if connection.vendor == 'postgresql':
+        match_sql, rank_sql = _POSTGRESQL_MATCH_SQL, _POSTGRESQL_RANK_SQL
+    elif connection.vendor == 'sqlite':
+        query = _fts5_query(query)
+        if not query:
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        match_sql, rank_sql = _SQLITE_MATCH_SQL, _SQLITE_RANK_SQL
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.filter(
+        id__in=RawSQL(match_sql, (query,))
+    ).annotate(
+        search_rank=RawSQL(rank_sql, (query,), output_field=FloatField())
+    )
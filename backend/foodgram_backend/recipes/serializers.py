@@ -1,8 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 
+from api.fast_representation import fast_representation
 from users.models import User, Follow
 from recipes.models import ShoppingCart
+from .images import Base64ImageField, image_url, rendition_urls
 from .models import Favorite, Ingredient, IngredientsInRecipe, Recipe, Tag
 
 
@@ -26,6 +28,8 @@ class CopyExistingUserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context.get('request').user.is_anonymous:
             return False
         user = self.context.get('request').user
@@ -77,7 +81,14 @@ class TagsInRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = CopyExistingUserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = serializers.SerializerMethodField(
+        read_only=True,
+        method_name='get_image'
+    )
+    images = serializers.SerializerMethodField(
+        read_only=True,
+        method_name='get_images'
+    )
     tags = TagSerializer(many=True)
     ingredients = RecipeIngredientAmountSerializer(
         many=True,
@@ -99,6 +110,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'images',
             'text',
             'ingredients',
             'tags',
@@ -107,13 +119,33 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorited'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        if settings.FAST_READ_SERIALIZERS:
+            return fast_representation(self, instance)
+        return super().to_representation(instance)
+
+    def get_image(self, obj):
+        """Вариант картинки из контекста ('list' или 'detail'), если он
+        уже готов, иначе оригинал."""
+        name = obj.image_renditions.get(self.context.get('image_rendition'))
+        return image_url(self.context.get('request'), name or obj.image.name)
+
+    def get_images(self, obj):
+        return rendition_urls(self.context.get('request'), obj)
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context.get('request').user.is_anonymous:
             return False
         user = self.context.get('request').user
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context.get('request').user.is_anonymous:
             return False
         user = self.context.get('request').user
@@ -170,6 +202,11 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Короткий вариант рецепта для отображения в избранном и подписках."""
 
+    image = serializers.SerializerMethodField(
+        read_only=True,
+        method_name='get_image'
+    )
+
     class Meta:
         model = Recipe
         fields = (
@@ -185,6 +222,14 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'image'
         )
 
+    def to_representation(self, instance):
+        if settings.FAST_READ_SERIALIZERS:
+            return fast_representation(self, instance)
+        return super().to_representation(instance)
+
+    def get_image(self, obj):
+        return image_url(self.context.get('request'), obj.image.name)
+
 
 class FavoriteSerializer(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -201,3 +246,26 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id',)
         read_only_fields = ('name', 'image', 'cooking_time')
+
+
+class ShoppingCartServingsSerializer(serializers.ModelSerializer):
+    """Во сколько раз увеличить рецепт в списке покупок."""
+
+    class Meta:
+        model = ShoppingCart
+        fields = ('servings',)
+        extra_kwargs = {
+            'servings': {'required': True, 'max_value': 100},
+        }
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,166 @@
+import csv
+import json
+
+from django.core.cache import cache
+from django.db.models import (
+    Case, CharField, F, PositiveIntegerField, Sum, Value, When
+)
+from django.http import StreamingHttpResponse
+
+from api.versions import bump_version, get_version
+from .models import IngredientsInRecipe, ShoppingCart
+
+CART_VERSION_NAME = 'shopping_cart:{user_id}'
+CART_CONTENT_KEY = 'shopping_cart:{user_id}:{version}:{file_format}'
+CART_CONTENT_TIMEOUT = 60 * 60 * 24
+CURSOR_CHUNK_SIZE = 500
+# Единица измерения ингредиента -> (единица в списке покупок, множитель).
+UNIT_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+
+
+def get_cart_version(user_id):
+    """Текущая версия списка покупок пользователя."""
+    return get_version(CART_VERSION_NAME.format(user_id=user_id))
+
+
+def bump_cart_version(user_id):
+    """Меняет версию списка покупок, делая закэшированные выгрузки
+    недействительными."""
+    bump_version(CART_VERSION_NAME.format(user_id=user_id))
+
+
+def bump_cart_versions_for_recipe(recipe_id):
+    """Меняет версию списков покупок всех, у кого в корзине этот рецепт."""
+    bump_cart_versions_for_recipes((recipe_id,))
+
+
+def bump_cart_versions_for_recipes(recipe_ids):
+    """То же для нескольких рецептов одним запросом."""
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True).distinct()
+    for user_id in user_ids:
+        bump_cart_version(user_id)
+
+
+def _unit_case(index, default, output_field):
+    """CASE по measurement_unit: единица или множитель из UNIT_CONVERSIONS."""
+    return Case(
+        *(
+            When(
+                ingredient__measurement_unit=unit,
+                then=Value(conversion[index])
+            )
+            for unit, conversion in UNIT_CONVERSIONS.items()
+        ),
+        default=default,
+        output_field=output_field
+    )
+
+
+def get_cart_ingredients(user):
+    """Суммы ингредиентов рецептов из списка покупок одним запросом.
+
+    Количество в рецепте умножается на servings записи в списке покупок.
+    Совместимые единицы сводятся к одной по UNIT_CONVERSIONS прямо в
+    запросе: «1 кг» и «300 г» одного ингредиента дают строку «1300 г».
+    Строки отсортированы по названию и единице.
+    """
+    return IngredientsInRecipe.objects.filter(
+        recipe__shopping_cart_recipe__user=user
+    ).annotate(
+        unit=_unit_case(0, F('ingredient__measurement_unit'), CharField())
+    ).values('ingredient__name', 'unit').annotate(ingredient_amount=Sum(
+        F('amount') * F('recipe__shopping_cart_recipe__servings')
+        * _unit_case(1, Value(1), PositiveIntegerField()),
+        output_field=PositiveIntegerField()
+    )).order_by('ingredient__name', 'unit').values_list(
+        'ingredient__name', 'ingredient_amount', 'unit'
+    )
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_txt(rows):
+    for name, amount, measurement_unit in rows:
+        yield f'{name} ({measurement_unit}) — {amount}\n'
+
+
+def render_json(rows):
+    yield '['
+    separator = ''
+    for name, amount, measurement_unit in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'csv': (render_csv, 'text/csv'),
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'json': (render_json, 'application/json'),
+}
+
+
+def _stream_and_cache(key, chunks):
+    buffer = []
+    for chunk in chunks:
+        buffer.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(buffer), CART_CONTENT_TIMEOUT)
+
+
+def shopping_cart_response(user, file_format='csv'):
+    """Потоковая выгрузка списка покупок в одном из EXPORT_FORMATS.
+
+    Готовый файл кэшируется под текущей версией корзины, поэтому
+    повторная выгрузка не обращается к базе данных.
+    """
+    render, content_type = EXPORT_FORMATS[file_format]
+    key = CART_CONTENT_KEY.format(
+        user_id=user.id,
+        version=get_cart_version(user.id),
+        file_format=file_format
+    )
+    content = cache.get(key)
+    if content is not None:
+        chunks = iter((content,))
+    else:
+        rows = get_cart_ingredients(user).iterator(
+            chunk_size=CURSOR_CHUNK_SIZE
+        )
+        chunks = _stream_and_cache(key, render(rows))
+    return StreamingHttpResponse(
+        chunks,
+        content_type=content_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="'
+                                   f'{user}.{file_format}"'
+        },
+    )
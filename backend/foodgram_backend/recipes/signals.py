@@ -0,0 +1,167 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api.counters import counter_delta, update_counter
+from api.versions import bump_model_version
+from users.models import Follow, User
+from .feed import backfill_timeline, fan_out_recipe, prune_timeline
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TAG_MASK_BITS
+)
+from .response_cache import (
+    invalidate_author,
+    invalidate_recipe,
+    invalidate_recipe_contents
+)
+from .search import index_recipes, unindex_recipe
+from .shopping_cart import bump_cart_version, bump_cart_versions_for_recipe
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    bump_cart_version(instance.user_id)
+
+
+@receiver(post_save, sender=IngredientsInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    bump_cart_versions_for_recipe(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def catalog_changed(sender, **kwargs):
+    bump_model_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorites_count_changed(sender, instance, signal, created=False,
+                            **kwargs):
+    update_counter(
+        Recipe, instance.recipe_id, 'favorites_count',
+        counter_delta(signal, created)
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def in_carts_count_changed(sender, instance, signal, created=False,
+                           **kwargs):
+    update_counter(
+        Recipe, instance.recipe_id, 'in_carts_count',
+        counter_delta(signal, created)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_count_changed(sender, instance, signal, created=False, **kwargs):
+    update_counter(
+        User, instance.author_id, 'recipes_count',
+        counter_delta(signal, created)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(fan_out_recipe, instance.id, instance.author_id)
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(backfill_timeline, instance.user_id, instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(prune_timeline, instance.user_id, instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=IngredientsInRecipe)
+def search_document_changed(sender, instance, **kwargs):
+    recipe_id = instance.id if sender is Recipe else instance.recipe_id
+    transaction.on_commit(partial(index_recipes, (recipe_id,)))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(partial(
+            index_recipes,
+            IngredientsInRecipe.objects.filter(
+                ingredient=instance
+            ).values_list('recipe_id', flat=True)
+        ))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """Строки тега в рецептах удаляются каскадом без сигналов, поэтому
+    бит тега снимается с масок рецептов одним UPDATE."""
+    if instance.id <= TAG_MASK_BITS:
+        Recipe.objects.filter(tagsinrecipe__tag=instance).update(
+            tags_mask=F('tags_mask').bitand(~(1 << instance.id))
+        )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    """Строки ингредиента в рецептах удаляются каскадом без сигналов."""
+    invalidate_recipe_contents(
+        IngredientsInRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    unindex_recipe(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_response_changed(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(invalidate_recipe, instance.id, instance.author_id)
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_response_deleted(sender, instance, **kwargs):
+    """Теги рецепта удаляются каскадом, поэтому их slug читаются заранее."""
+    transaction.on_commit(partial(
+        invalidate_recipe, instance.id, instance.author_id,
+        tag_slugs=set(
+            Tag.objects.filter(
+                tagsinrecipe__recipe=instance
+            ).values_list('slug', flat=True)
+        )
+    ))
+
+
+@receiver(post_save, sender=IngredientsInRecipe)
+def recipe_ingredients_response_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_recipe, instance.recipe_id))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    transaction.on_commit(partial(invalidate_author, instance.id))
@@ -1,10 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 
 from .views import (
     FavoriteViewSet, IngredientViewSet,
     RecipeViewSet, TagViewSet,
-    ShoppingCartViewSet, download_shopping_cart
+    ShoppingCartViewSet, download_shopping_cart,
+    favorite_toggle, shopping_cart_toggle
 )
 
 app_name = 'recipes'
@@ -33,3 +35,17 @@ urlpatterns = [
     path('', include(router.urls)),
 
 ]
+
+if settings.ASYNC_TOGGLES:
+    urlpatterns = [
+        path(
+            'recipes/<int:recipe_id>/favorite/',
+            favorite_toggle,
+            name='favorite-toggle'
+        ),
+        path(
+            'recipes/<int:recipe_id>/shopping_cart/',
+            shopping_cart_toggle,
+            name='shopping_cart-toggle'
+        ),
+    ] + urlpatterns
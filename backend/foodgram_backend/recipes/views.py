@@ -1,31 +1,64 @@
-import csv
+from functools import partial
 
 import django_filters
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.validators import slug_re
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
-from rest_framework import status, viewsets, permissions, filters
+from rest_framework import exceptions, status, viewsets, permissions, filters
 from rest_framework.decorators import action, api_view
-from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 
+from api.conditional import ConditionalGetMixin
+from api.counters import update_counters
+from api.pagination import PAGE_SIZE, PageNumberOrCursorPagination
+from api.response_cache import AnonymousResponseCacheMixin
+from api.toggles import (
+    async_toggle_view,
+    delete_link,
+    delete_links,
+    insert_link,
+    insert_links
+)
+from api.versions import model_version_name
 from .models import (
     Favorite, Ingredient,
     Recipe, Tag,
     TagsInRecipe, ShoppingCart,
-    IngredientsInRecipe
+    IngredientsInRecipe, tags_mask
+)
+from .filters import RecipeFilter, RecipeSearchFilter
+from .feed import drop_missing_recipes, get_feed_ids
+from .images import schedule_renditions
+from .ingredient_index import ingredient_index
+from .payload_cache import user_recipe_payloads
+from .response_cache import (
+    RECIPES_VERSION,
+    author_version_name,
+    invalidate_recipe,
+    recipe_version_name,
+    tag_version_name
+)
+from .shopping_cart import (
+    EXPORT_FORMATS,
+    bump_cart_version,
+    bump_cart_versions_for_recipe,
+    shopping_cart_response
 )
-from .filters import RecipeFilter
 from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientsSerializer, RecipeSerializer,
-                          TagSerializer, ShoppingCartSerializer,
+                          IngredientsSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, TagSerializer,
+                          ShoppingCartSerializer,
+                          ShoppingCartServingsSerializer,
                           ShortRecipeSerializer)
 from users.permissions import AuthorOrAdminOrReadOnly, ReadOnly
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = TagSerializer
+    version_models = (Tag,)
     queryset = Tag.objects.all()
     http_method_names = ('get',)
     pagination_class = None
@@ -39,46 +72,106 @@ class IngredientSearchFilter(FilterSet):
         fields = ('name',)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = IngredientsSerializer
+    version_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     http_method_names = ('get',)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientSearchFilter
 
+    def search(self, request, *args, **kwargs):
+        return Response(ingredient_index.search(request.query_params['name']))
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('name'):
+            return self.conditional_response(
+                self.search, request, *args, **kwargs
+            )
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrAdminOrReadOnly,)
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 6
-    filter_backends = (DjangoFilterBackend, filters.OrderingFilter,)
+    pagination_class = PageNumberOrCursorPagination
+    filter_backends = (
+        DjangoFilterBackend, filters.OrderingFilter, RecipeSearchFilter
+    )
     filterset_class = RecipeFilter
     ordering_fields = ('name', 'author')
+    ordering = ('-id',)
+    cache_query_params = (
+        'page', 'cursor', 'tags', 'tags_match', 'author', 'ordering',
+        'search'
+    )
+
+    def get_cache_version_names(self, request):
+        """Ответ зависит от тегов и ингредиентов и от рецептов выборки:
+        одного рецепта, рецептов автора, рецептов с тегами или всех."""
+        names = [model_version_name(Tag), model_version_name(Ingredient)]
+        if self.action == 'retrieve':
+            pk = self.kwargs['pk']
+            if not pk.isdecimal():
+                return None
+            return [*names, recipe_version_name(int(pk))]
+        author = request.query_params.get('author')
+        tags = request.query_params.getlist('tags')
+        if author:
+            # Фильтр приводит значение к числу: «01» — тот же автор 1.
+            if not author.isdecimal():
+                return None
+            names.append(author_version_name(int(author)))
+        elif tags:
+            # Slug тега входит в ключ кэша, а memcached не принимает
+            # пробелы и не-ASCII символы.
+            if not all(map(slug_re.match, tags)):
+                return None
+            names.extend(map(tag_version_name, tags))
+        else:
+            names.append(RECIPES_VERSION)
+        return names
+
+    def uses_payload_cache(self):
+        """Авторизованным list и retrieve собираются из кэша данных
+        рецептов и флагов пользователя, см. recipes/payload_cache.py."""
+        return (
+            settings.RECIPE_PAYLOAD_CACHE
+            and self.action in ('list', 'retrieve')
+            and not self.request.user.is_anonymous
+        )
 
     def get_queryset(self):
-        if not self.request.user.is_anonymous:
-            user = self.request.user
-            queryset = Recipe.objects.all()
-            is_favorited = int(
-                self.request.query_params.get('is_favorited', default=0)
+        if self.uses_payload_cache():
+            queryset = Recipe.objects.only('id', 'name', 'author_id')
+        else:
+            queryset = Recipe.objects.with_related().with_user_flags(
+                self.request.user
             )
-            is_in_shopping_cart = int(
-                self.request.query_params.get('is_in_shopping_cart', default=0)
-            )
-            author_id = int(
-                self.request.query_params.get('author', default=0)
-            )
-            tags = self.request.query_params.getlist('tags', default=0)
+        return queryset.order_by('-id')
 
-            if is_favorited == 1:
-                queryset = queryset.filter(favorite_recipe__user=user)
-            if is_in_shopping_cart == 1:
-                queryset = queryset.filter(shopping_cart_recipe__user=user)
-            if author_id != 0:
-                queryset = queryset.filter(author_id=author_id)
-            return queryset
-        return Recipe.objects.all()
+    def list(self, request, *args, **kwargs):
+        if not self.uses_payload_cache():
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.get_paginated_response(user_recipe_payloads(
+            request.user,
+            [recipe.id for recipe in page],
+            self.get_serializer_context()
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_payload_cache():
+            return super().retrieve(request, *args, **kwargs)
+        recipe = self.get_object()
+        payloads = user_recipe_payloads(
+            request.user, [recipe.id], self.get_serializer_context()
+        )
+        if not payloads:
+            raise exceptions.NotFound()
+        return Response(payloads[0])
 
     def get_permissions(self):
         if self.action in ('retrieve', 'list'):
@@ -90,22 +183,194 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeSerializer
         return CreateRecipeSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_rendition'] = (
+            'list' if self.action in ('list', 'feed') else 'detail'
+        )
+        return context
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        paginator = PageNumberPagination()
+        paginator.page_size = PAGE_SIZE
+        page_ids = paginator.paginate_queryset(
+            get_feed_ids(request.user.id), request, view=self
+        )
+        if settings.RECIPE_PAYLOAD_CACHE:
+            data = user_recipe_payloads(
+                request.user, page_ids, self.get_serializer_context()
+            )
+            found_ids = {payload['id'] for payload in data}
+        else:
+            recipes = Recipe.objects.with_related().with_user_flags(
+                request.user
+            ).in_bulk(page_ids)
+            data = RecipeSerializer(
+                [recipes[recipe_id] for recipe_id in page_ids
+                 if recipe_id in recipes],
+                many=True,
+                context=self.get_serializer_context()
+            ).data
+            found_ids = recipes.keys()
+        missing_ids = set(page_ids) - found_ids
+        if missing_ids:
+            drop_missing_recipes(request.user.id, missing_ids)
+        return paginator.get_paginated_response(data)
+
+    def bulk_links(self, request, model, counter_field):
+        """Добавляет (POST) или убирает (DELETE) пачку рецептов.
+
+        Один запрос с IN проверяет id, один INSERT или DELETE применяет
+        изменения, один UPDATE правит счётчики. Для каждого id
+        возвращается результат: added, exists, removed, absent или
+        not_found. Возвращает ответ и множество изменённых id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(
+            Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                'id', flat=True
+            )
+        )
+        if request.method == 'POST':
+            apply, delta, done, unchanged = insert_links, 1, 'added', 'exists'
+        else:
+            apply, delta, done, unchanged = (
+                delete_links, -1, 'removed', 'absent'
+            )
+        with transaction.atomic():
+            changed = set(apply(
+                model, request.user.pk, 'recipe',
+                [recipe_id for recipe_id in recipe_ids if recipe_id in found]
+            ))
+            update_counters(Recipe, changed, counter_field, delta)
+        return Response({
+            'results': [
+                {
+                    'id': recipe_id,
+                    'status': (
+                        done if recipe_id in changed
+                        else unchanged if recipe_id in found
+                        else 'not_found'
+                    )
+                }
+                for recipe_id in recipe_ids
+            ]
+        }), changed
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='favorite',
+        url_name='bulk-favorite',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        """Пакетное добавление рецептов в избранное и удаление из него."""
+        response, _ = self.bulk_links(request, Favorite, 'favorites_count')
+        return response
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='shopping_cart',
+        url_name='bulk-shopping-cart',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        """Пакетное добавление рецептов в список покупок и удаление."""
+        response, changed = self.bulk_links(
+            request, ShoppingCart, 'in_carts_count'
+        )
+        if changed:
+            bump_cart_version(request.user.pk)
+        return response
+
     def create_ingredients_in_recipe(self, recipe, ingredients):
-        for ingredient in ingredients:
-            ingredient_id = ingredient['ingredient']['id']
-            amount = ingredient['amount']
-            IngredientsInRecipe.objects.create(
-                ingredient_id=ingredient_id,
+        IngredientsInRecipe.objects.bulk_create(
+            IngredientsInRecipe(
+                ingredient_id=ingredient['ingredient']['id'],
                 recipe=recipe,
-                amount=amount
+                amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        )
 
     def create_tags_in_recipe(self, recipe, tags):
-        for tag in tags:
-            TagsInRecipe.objects.create(
-                recipe=recipe,
-                tag_id=tag
+        TagsInRecipe.objects.bulk_create(
+            TagsInRecipe(recipe=recipe, tag_id=tag)
+            for tag in dict.fromkeys(tags)
+        )
+
+    def update_ingredients_in_recipe(self, recipe, ingredients):
+        """Применяет к рецепту только разницу в ингредиентах."""
+        amounts = {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in IngredientsInRecipe.objects.filter(recipe=recipe)
+        }
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        removed = existing.keys() - amounts.keys()
+
+        if removed:
+            IngredientsInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            IngredientsInRecipe.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients_in_recipe(
+            recipe=recipe,
+            ingredients=(
+                ingredient for ingredient in ingredients
+                if ingredient['ingredient']['id'] not in existing
             )
+        )
+
+    def update_tags_in_recipe(self, recipe, tags):
+        """Применяет к рецепту только разницу в тегах.
+
+        Возвращает slug снятых тегов: после удаления строк их версии
+        уже не найти по рецепту.
+        """
+        existing = dict(
+            TagsInRecipe.objects.filter(
+                recipe=recipe
+            ).values_list('tag_id', 'tag__slug')
+        )
+        removed = existing.keys() - set(tags)
+        if removed:
+            TagsInRecipe.objects.filter(
+                recipe=recipe, tag_id__in=removed
+            ).delete()
+        self.create_tags_in_recipe(
+            recipe=recipe,
+            tags=(tag for tag in tags if tag not in existing)
+        )
+        return {existing[tag] for tag in removed}
+
+    def get_output_data(self, recipe):
+        recipe = Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        ).get(pk=recipe.pk)
+        return RecipeSerializer(
+            instance=recipe,
+            context=self.get_serializer_context()
+        ).data
 
     def update(self, request, *args, **kwargs):
         serializer = CreateRecipeSerializer(
@@ -116,20 +381,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         ingredients = serializer.validated_data.pop('ingredientsinrecipe_set')
         tags = serializer.validated_data.pop('tags')
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get('pk'))
-        TagsInRecipe.objects.filter(recipe=recipe).delete()
-        IngredientsInRecipe.objects.filter(recipe_id=recipe).delete()
-        Recipe.objects.update(**serializer.validated_data)
-        self.create_ingredients_in_recipe(
-            recipe=recipe,
-            ingredients=ingredients
-        )
-        self.create_tags_in_recipe(recipe=recipe, tags=tags)
-        serializer = RecipeSerializer(
-            instance=recipe,
-            context={'request': request}
+        serializer.validated_data.pop('author')
+        with transaction.atomic():
+            recipe = get_object_or_404(
+                Recipe.objects.select_for_update(), id=self.kwargs.get('pk')
+            )
+            self.check_object_permissions(request, recipe)
+            removed_tag_slugs = self.update_tags_in_recipe(
+                recipe=recipe, tags=tags
+            )
+            for field, value in serializer.validated_data.items():
+                setattr(recipe, field, value)
+            recipe.tags_mask = tags_mask(tags)
+            update_fields = [*serializer.validated_data, 'tags_mask']
+            if 'image' in serializer.validated_data:
+                recipe.image_renditions = {}
+                update_fields.append('image_renditions')
+            recipe.save(update_fields=update_fields)
+            if 'image' in serializer.validated_data:
+                schedule_renditions(recipe)
+            self.update_ingredients_in_recipe(
+                recipe=recipe,
+                ingredients=ingredients
+            )
+            transaction.on_commit(
+                lambda: bump_cart_versions_for_recipe(recipe.id)
+            )
+            if removed_tag_slugs:
+                # Текущие теги сдвигает сигнал сохранения рецепта.
+                transaction.on_commit(partial(
+                    invalidate_recipe, recipe.id, recipe.author_id,
+                    tag_slugs=removed_tag_slugs
+                ))
+        if 'image' in serializer.validated_data:
+            serializer.validated_data['image'].close()
+        return Response(
+            self.get_output_data(recipe),
+            status=status.HTTP_201_CREATED
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def create(self, request, *args, **kwargs):
         serializer = CreateRecipeSerializer(
@@ -139,18 +428,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         ingredients = serializer.validated_data.pop('ingredientsinrecipe_set')
         tags = serializer.validated_data.pop('tags')
-        recipe = Recipe.objects.create(**serializer.validated_data)
-
-        self.create_ingredients_in_recipe(
-            recipe=recipe,
-            ingredients=ingredients
-        )
-        self.create_tags_in_recipe(recipe=recipe, tags=tags)
-        serializer = RecipeSerializer(
-            instance=recipe,
-            context={'request': request}
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                **serializer.validated_data, tags_mask=tags_mask(tags)
+            )
+            schedule_renditions(recipe)
+            self.create_ingredients_in_recipe(
+                recipe=recipe,
+                ingredients=ingredients
+            )
+            self.create_tags_in_recipe(recipe=recipe, tags=tags)
+        serializer.validated_data['image'].close()
+        return Response(
+            self.get_output_data(recipe),
+            status=status.HTTP_201_CREATED
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class FavoriteViewSet(viewsets.ModelViewSet):
@@ -173,9 +465,10 @@ class FavoriteViewSet(viewsets.ModelViewSet):
                 'Рецепт уже есть в избранном!',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        favorite = Favorite.objects.create(
-            user=self.request.user, recipe=recipe
-        )
+        with transaction.atomic():
+            favorite = Favorite.objects.create(
+                user=self.request.user, recipe=recipe
+            )
         data = {
             'id': favorite.recipe.id,
             'name': favorite.recipe.name,
@@ -208,7 +501,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
 class ShoppingCartViewSet(viewsets.ModelViewSet):
     serializer_class = ShoppingCartSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    http_method_names = ('post', 'delete')
+    http_method_names = ('post', 'patch', 'delete')
 
     def get_queryset(self):
         current_user = self.request.user
@@ -225,7 +518,8 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
                 'Рецепт уже есть в списке покупок!',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        ShoppingCart.objects.create(user=self.request.user, recipe=recipe)
+        with transaction.atomic():
+            ShoppingCart.objects.create(user=self.request.user, recipe=recipe)
         return Response(
             'Рецептв вашем списке покупок!',
             status=status.HTTP_201_CREATED
@@ -248,26 +542,79 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
         ).delete()
         return Response('Рецепт убран из вашего списка покупок')
 
+    def partial_update(self, request, **kwargs):
+        """Порции меняются через servings: id записи в адресе не нужен."""
+        raise exceptions.MethodNotAllowed(request.method)
+
+    @action(methods=('patch',), detail=False)
+    def servings(self, request, **kwargs):
+        """Меняет число порций рецепта в списке покупок."""
+        cart_entry = get_object_or_404(
+            ShoppingCart,
+            user=self.request.user,
+            recipe_id=self.kwargs.get('recipe_id')
+        )
+        serializer = ShoppingCartServingsSerializer(
+            cart_entry, data=request.data, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+def recipe_missing_or(recipe_id, message):
+    """Ответ, когда переключатель ничего не изменил: 404, если рецепта
+    нет, иначе 400 с сообщением как у синхронных view."""
+    if not Recipe.objects.filter(pk=recipe_id).exists():
+        return {'detail': exceptions.NotFound.default_detail}, 404
+    return message, status.HTTP_400_BAD_REQUEST
+
+
+def add_favorite(user, recipe_id):
+    if not insert_link(Favorite, user.pk, 'recipe', recipe_id):
+        return recipe_missing_or(recipe_id, 'Рецепт уже есть в избранном!')
+    recipe = Recipe.objects.only(
+        'id', 'name', 'image', 'cooking_time'
+    ).get(pk=recipe_id)
+    return ShortRecipeSerializer(recipe).data, status.HTTP_201_CREATED
+
+
+def remove_favorite(user, recipe_id):
+    if not delete_link(Favorite, user.pk, 'recipe', recipe_id):
+        return recipe_missing_or(recipe_id, 'Этот рецепт не в избранном')
+    return 'Рецепт убран из избранного', status.HTTP_200_OK
+
+
+def add_to_shopping_cart(user, recipe_id):
+    if not insert_link(ShoppingCart, user.pk, 'recipe', recipe_id):
+        return recipe_missing_or(
+            recipe_id, 'Рецепт уже есть в списке покупок!'
+        )
+    return 'Рецептв вашем списке покупок!', status.HTTP_201_CREATED
+
+
+def remove_from_shopping_cart(user, recipe_id):
+    if not delete_link(ShoppingCart, user.pk, 'recipe', recipe_id):
+        return recipe_missing_or(
+            recipe_id, 'Этого рецепта нет вашем списке покупок'
+        )
+    return 'Рецепт убран из вашего списка покупок', status.HTTP_200_OK
+
+
+favorite_toggle = async_toggle_view(add_favorite, remove_favorite)
+shopping_cart_toggle = async_toggle_view(
+    add_to_shopping_cart, remove_from_shopping_cart
+)
+
 
 @api_view(('GET',))
 def download_shopping_cart(request):
     if request.user.is_anonymous:
         return Response(status=status.HTTP_401_UNAUTHORIZED)
-    ingredients = IngredientsInRecipe.objects.filter(
-        recipe__author=request.user.id
-    ).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(ingredient_amount=Sum('amount')).values_list(
-        'ingredient__name', 'ingredient_amount', 'ingredient__measurement_unit'
-    )
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={
-            'Content-Disposition': f'attachment; filename="'
-                                   f'{request.user}.csv"'},
-    )
-    response.write(u'\ufeff'.encode('utf8'))
-    writer = csv.writer(response)
-    for product in list(ingredients):
-        writer.writerow(product)
-    return response
+    file_format = request.query_params.get('file_format', default='csv')
+    if file_format not in EXPORT_FORMATS:
+        return Response(
+            'Неподдерживаемый формат списка покупок',
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return shopping_cart_response(request.user, file_format)
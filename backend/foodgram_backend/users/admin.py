@@ -1,11 +1,25 @@
 from django.contrib import admin
 
+from api.pagination import EstimatedCountPaginator
 from .models import User, Follow
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_filter = ('username', 'email')
+    list_filter = ('role', 'is_active')
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
+    search_fields = ('^username', '^email')
+    ordering = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
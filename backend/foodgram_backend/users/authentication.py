@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import User
+
+TOKEN_CACHE_KEY = 'auth-token:{digest}'
+# Model.from_db ждёт значения в порядке полей модели.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id',
+        'username',
+        'email',
+        'first_name',
+        'last_name',
+        'role',
+        'is_staff',
+        'is_superuser',
+        'is_active',
+    }
+)
+
+
+class LRUCache:
+    """Словарь в памяти процесса с ограниченным размером и временем жизни
+    записей. Дольше всех не читавшиеся записи вытесняются первыми."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, max_size):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LRUCache()
+
+
+def token_cache_key(key):
+    """Сам токен в ключ кэша не попадает."""
+    return TOKEN_CACHE_KEY.format(
+        digest=hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
+def forget_tokens(keys):
+    """Убирает токены из кэша этого процесса и из общего кэша."""
+    keys = list(keys)
+    local_tokens.discard(keys)
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def shared_token_timeout():
+    """Время жизни токена в общем кэше. LocMemCache у каждого процесса
+    свой, удаление из него другие процессы не видят, поэтому запись
+    в нём живёт не дольше TOKEN_CACHE_LOCAL_TTL."""
+    if isinstance(caches['default'], LocMemCache):
+        return settings.TOKEN_CACHE_LOCAL_TTL
+    return settings.TOKEN_CACHE_TIMEOUT
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый вызов API.
+
+    По ключу токена кэшируется снимок пользователя — значения полей
+    SNAPSHOT_FIELDS — сначала в общем кэше на shared_token_timeout()
+    секунд, затем в LRU процесса на TOKEN_CACHE_LOCAL_TTL секунд. Из снимка
+    собирается экземпляр User с отложенными остальными полями: пароль и
+    счётчики читаются из базы только при обращении к ним, а save() пишет
+    лишь загруженные поля.
+
+    Выход, удаление пользователя, смена пароля или роли удаляют токен из
+    общего кэша и из LRU текущего процесса (см. users/signals.py). В других
+    процессах запись живёт не дольше TOKEN_CACHE_LOCAL_TTL, если общий кэш
+    действительно общий (memcached); с LocMemCache — столько же, потому
+    что и «общая» запись там хранится лишь TOKEN_CACHE_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = local_tokens.get(key)
+        if snapshot is None:
+            cache_key = token_cache_key(key)
+            snapshot = cache.get(cache_key)
+            if snapshot is None:
+                snapshot = self.get_model().objects.filter(
+                    key=key
+                ).values_list(
+                    *(f'user__{field}' for field in SNAPSHOT_FIELDS)
+                ).first()
+                if snapshot is None:
+                    raise exceptions.AuthenticationFailed(
+                        _('Invalid token.')
+                    )
+                cache.set(cache_key, snapshot, shared_token_timeout())
+            if settings.TOKEN_CACHE_LOCAL_TTL:
+                local_tokens.set(
+                    key, snapshot,
+                    settings.TOKEN_CACHE_LOCAL_TTL, settings.TOKEN_CACHE_SIZE
+                )
+
+        user = User.from_db(
+            router.db_for_read(User), SNAPSHOT_FIELDS, snapshot
+        )
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return (user, self.get_model()(key=key, user=user))
@@ -21,6 +21,16 @@ class User(AbstractUser):
         max_length=max(len(role[1]) for role in roles),
         default=USER,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         constraints = [
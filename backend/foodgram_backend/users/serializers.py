@@ -96,15 +96,20 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj.author)
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.author_id, ())
+        else:
+            recipes = Recipe.objects.filter(author=obj.author)
         serializer = ShortRecipeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author_id=obj.id)
-        return recipes.count()
+        return obj.author.recipes_count
 
     def get_is_subscribed(self, obj):
+        if 'recipes_by_author' in self.context:
+            return True
         return obj.user.follower.filter(author=obj.author).exists()
 
 
@@ -0,0 +1,47 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.counters import counter_delta, update_counter
+from .authentication import forget_tokens
+from .models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def followers_count_changed(sender, instance, signal, created=False,
+                            **kwargs):
+    update_counter(
+        User, instance.author_id, 'followers_count',
+        counter_delta(signal, created)
+    )
+
+
+def _forget_tokens(keys):
+    """Сразу и ещё раз после фиксации: иначе параллельный запрос успеет
+    положить в кэш снимок из незафиксированного состояния."""
+    forget_tokens(keys)
+    transaction.on_commit(partial(forget_tokens, keys))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход из системы и удаление пользователя вместе с токеном."""
+    _forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_credentials_changed(sender, instance, created, update_fields=None,
+                             **kwargs):
+    """Смена пароля, роли и других полей снимка пользователя."""
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    keys = list(
+        Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+        )
+    )
+    if keys:
+        _forget_tokens(keys)
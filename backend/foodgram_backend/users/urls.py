@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 
 from .views import (
     FollowOnUserViewSet,
-    UserViewSet
+    UserViewSet,
+    follow_toggle
 )
 
 app_name = 'users'
@@ -25,3 +27,12 @@ urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
 
 ]
+
+if settings.ASYNC_TOGGLES:
+    urlpatterns = [
+        path(
+            'users/<int:user_id>/subscribe/',
+            follow_toggle,
+            name='following-toggle'
+        ),
+    ] + urlpatterns
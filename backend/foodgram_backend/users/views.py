@@ -1,10 +1,13 @@
 import djoser.views
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from rest_framework import permissions, status, viewsets
+from rest_framework import exceptions, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from api.pagination import PageNumberOrCursorPagination
+from api.toggles import async_toggle_view, delete_link, insert_link
+from recipes.models import Recipe
 from .models import Follow, User
 from .mixins import ListCreateDestroyViewSet
 from .permissions import AuthorOrAdminOrReadOnly, Admin
@@ -15,12 +18,11 @@ from .serializers import (
     FollowOutputSerializer,
     ExistingUserSerializer
 )
-from recipes.models import Recipe
 
 
 class UserViewSet(djoser.views.UserViewSet):
-    queryset = User.objects.all()
-    pagination_class = PageNumberPagination
+    queryset = User.objects.order_by('id')
+    pagination_class = PageNumberOrCursorPagination
 
     def get_permissions(self):
         if self.action in ('list', 'retrieve', 'create'):
@@ -44,15 +46,48 @@ class FollowOnUserViewSet(ListCreateDestroyViewSet):
     """Создание подписки."""
     serializer_class = FollowSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 6
+    pagination_class = PageNumberOrCursorPagination
     http_method_names = ['get', 'post', 'delete']
 
     def get_queryset(self):
         current_user = self.request.user
-        queryset = Follow.objects.filter(user=current_user)
+        queryset = Follow.objects.filter(
+            user=current_user
+        ).select_related('author').order_by('-id')
         return queryset
 
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        follows = list(queryset) if page is None else page
+
+        recipes_by_author = {}
+        for recipe in Recipe.objects.filter(
+            author_id__in=[follow.author_id for follow in follows]
+        ).only(
+            'id', 'author_id', 'name', 'image', 'cooking_time'
+        ).latest_per_author(self.get_recipes_limit()):
+            recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
+
+        serializer = self.get_serializer(
+            follows,
+            many=True,
+            context={
+                **self.get_serializer_context(),
+                'recipes_by_author': recipes_by_author
+            }
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
     def create(self, request, **kwargs):
         id = self.kwargs.get('user_id')
         author = get_object_or_404(User, id=id)
@@ -76,7 +111,8 @@ class FollowOnUserViewSet(ListCreateDestroyViewSet):
         }
         serializer = FollowCreateSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         context = {
             'request': request,
             'id': id,
@@ -84,7 +120,7 @@ class FollowOnUserViewSet(ListCreateDestroyViewSet):
             'username': author.username,
             'first_name': author.first_name,
             'last_name': author.last_name,
-            'recipes_count': Recipe.objects.filter(author=author).count()
+            'recipes_count': author.recipes_count
         }
         serializer_output = FollowOutputSerializer(
             data={'id': id},
@@ -110,3 +146,45 @@ class FollowOnUserViewSet(ListCreateDestroyViewSet):
             )
         Follow.objects.filter(user=self.request.user, author=author).delete()
         return Response('Подписка отменена')
+
+
+def author_missing_or(author_id, message):
+    """Ответ, когда переключатель ничего не изменил: 404, если автора
+    нет, иначе 400 с сообщением как у FollowOnUserViewSet."""
+    if not User.objects.filter(pk=author_id).exists():
+        return {'detail': exceptions.NotFound.default_detail}, 404
+    return message, status.HTTP_400_BAD_REQUEST
+
+
+def follow(user, user_id):
+    if user.pk == user_id:
+        return author_missing_or(
+            user_id, 'Невозможно подписаться на самого себя!'
+        )
+    if not insert_link(Follow, user.pk, 'author', user_id):
+        return author_missing_or(user_id, 'Подписка уже существует')
+    author = User.objects.get(pk=user_id)
+    serializer = FollowOutputSerializer(
+        data={'id': user_id},
+        context={
+            'id': user_id,
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'recipes_count': author.recipes_count
+        }
+    )
+    serializer.is_valid(raise_exception=True)
+    return serializer.data, status.HTTP_201_CREATED
+
+
+def unfollow(user, user_id):
+    if not delete_link(Follow, user.pk, 'author', user_id):
+        return author_missing_or(
+            user_id, 'Нечего удалять. Вы не подписаны на этого пользователя'
+        )
+    return 'Подписка отменена', status.HTTP_200_OK
+
+
+follow_toggle = async_toggle_view(follow, unfollow)